@@ -19,7 +19,7 @@ class BreedsGet(RestRequest):
 
 class BreedGet(RestRequest):
 	def __init__(self, breed_id: str):
-		RestRequest.__init__(self, 'GET', f'/breeds/{breed_id}')
+		RestRequest.__init__(self, 'GET', f'/breeds/{breed_id}', path_template='/breeds/{breed_id}')
 
 
 class TheCatApiClient(RestClient):
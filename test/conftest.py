@@ -0,0 +1,83 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import threading
+import json
+import pytest
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+	calls = {}
+
+	def do_GET(self):	# pylint: disable=invalid-name
+
+		if self.path.startswith('/fail'):
+			self.connection.close()
+			return
+
+		if self.path.startswith('/eventually/'):
+			# Not found until requested the number of times in the path
+			calls = _Handler.calls[self.path] = _Handler.calls.get(self.path, 0) + 1
+			if calls < int(self.path.rsplit('/', 1)[1]):
+				self.send_response(404)
+				self.send_header('Content-Length', '0')
+				self.end_headers()
+				return
+
+		headers = {}
+		if self.path.startswith('/pages/'):
+			# 95 items listed in pages of 10 with Link header, cursor or offset pagination
+			url = urlsplit(self.path)
+			query = {name: values[0] for name, values in parse_qs(url.query).items()}
+			if url.path == '/pages/link':
+				page = int(query.get('page', 0))
+				body = list(range(page * 10, min(page * 10 + 10, 95)))
+				if page < 9:
+					headers['Link'] = f'</pages/link?page={page + 1}>; rel="next"'
+			elif url.path == '/pages/cursor':
+				start = int(query.get('cursor', 0))
+				body = {'items': list(range(start, min(start + 10, 95))), 'next_cursor': str(start + 10) if start < 85 else None}
+			else:
+				offset, limit = int(query['offset']), int(query['limit'])
+				body = list(range(offset, min(offset + limit, 95)))
+			body = json.dumps(body).encode()
+		elif self.path.startswith('/export'):
+			# Item 500 has a string id
+			items = [{'id': str(i) if i == 500 else i} for i in range(1000)]
+			body = json.dumps(items).encode()
+		else:
+			body = json.dumps({'path': self.path}).encode()
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		for header, value in headers.items():
+			self.send_header(header, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_POST(self):	# pylint: disable=invalid-name
+
+		length = int(self.headers.get('Content-Length', 0))
+		body = json.dumps({
+			'path': self.path,
+			'body': json.loads(self.rfile.read(length)),
+			'api_key': self.headers.get('X-API-Key')
+		}).encode()
+		self.send_response(201)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):	# pylint: disable=redefined-builtin
+		...
+
+
+@pytest.fixture(scope='session')
+def base_url():
+
+	server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	yield f'http://127.0.0.1:{server.server_port}'
+	server.shutdown()
@@ -0,0 +1,39 @@
+import pytest
+from testessera import LatencyHistogram
+
+
+def test_latency_histogram_percentiles_relative_error():
+
+	histogram = LatencyHistogram()
+	for us in range(1, 100_001):
+		histogram.record_us(us)
+
+	assert histogram.count == 100_000
+	assert histogram.percentile(50) == pytest.approx(0.050, rel=0.01)
+	assert histogram.percentile(99) == pytest.approx(0.099, rel=0.01)
+	assert histogram.percentile(99.9) == pytest.approx(0.0999, rel=0.01)
+	assert histogram.max == 0.1
+	assert histogram.min == 0.000001
+
+
+def test_latency_histogram_merge():
+
+	first = LatencyHistogram()
+	second = LatencyHistogram()
+	first.record(0.010)
+	second.record(0.020)
+	second.record(0.030)
+
+	first.merge(second)
+
+	assert first.count == 3
+	assert first.max == 0.030
+	assert first.mean == pytest.approx(0.020)
+
+
+def test_latency_histogram_empty():
+
+	histogram = LatencyHistogram()
+
+	assert histogram.percentile(99) == 0.0
+	assert histogram.min is None
@@ -1,5 +1,9 @@
+import gzip
+import json
 import pytest
-from testessera import assert_json
+from testessera import assert_json, schema_validator_cache
+from testessera import assert_json_stream, validate_json_stream, JsonMatcher, ANY, KafkaConsumer, KafkaProducer
+from testessera.json import SchemaValidatorCache, iter_json_array, compile_json_path, get_json_path
 
 
 def test_assert_instance_expected_instance_success():
@@ -82,3 +86,127 @@ def test_assert_json_value_error_neither_parameter_provided():
 
 	with pytest.raises(ValueError):
 		assert_json({'name': 'John', 'age': 30})
+
+
+def test_assert_json_expected_schema_validator_cached():
+
+	schema_validator_cache.clear()
+	for age in range(10):
+		assert_json({'name': 'John', 'age': age}, expected_schema={'type': 'object', 'required': ['name']})
+
+	info = schema_validator_cache.info()
+	assert info.misses == 1
+	assert info.hits == 9
+	assert info.currsize == 1
+
+
+def test_schema_validator_cache_copies_schema():
+
+	schema = {'type': 'object', 'required': ['a']}
+	assert_json({'a': 1}, expected_schema=schema)
+	schema['required'] = ['b']
+
+	assert_json({'a': 1}, expected_schema={'type': 'object', 'required': ['a']})
+	with pytest.raises(AssertionError):
+		assert_json({'a': 1}, expected_schema=schema)
+
+
+def test_schema_validator_cache_lru_eviction():
+
+	cache = SchemaValidatorCache(maxsize=2)
+	cache.get({'type': 'string'})
+	cache.get({'type': 'number'})
+	cache.get({'type': 'string'})
+	cache.get({'type': 'object'})
+	cache.get({'type': 'string'})
+	cache.get({'type': 'number'})
+
+	assert cache.info() == (2, 4, 2, 2)
+
+
+def test_iter_json_array_chunks():
+
+	instance = [1, 22, {'name': 'Jöhn', 'tags': ['a', 'b']}, 'x' * 1000, -1.5e3, True, None, []]
+	text = json.dumps(instance, ensure_ascii=False).encode()
+
+	for chunk_size in (1, 7, 64, 100_000):
+		chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+		assert list(iter_json_array(chunks)) == instance
+
+
+def test_iter_json_array_value_error():
+
+	with pytest.raises(ValueError):
+		list(iter_json_array(['{"name": "John"}']))
+
+	with pytest.raises(ValueError):
+		list(iter_json_array(['[1 2]']))
+
+
+@pytest.mark.parametrize('path', ['data.items.1.id', '/data/items/1/id'])
+def test_get_json_path(path):
+
+	instance = {'data': {'items': [{'id': 'a'}, {'id': 'b'}]}}
+
+	assert get_json_path(instance, path) == 'b'
+	assert compile_json_path(path) == ('data', 'items', '1', 'id')
+
+
+def test_get_json_path_json_pointer_escapes():
+
+	assert get_json_path({'a/b': {'c~d': 1}}, '/a~1b/c~0d') == 1
+
+
+RECORD_SCHEMA = {'type': 'object', 'properties': {'id': {'type': 'integer'}}, 'required': ['id']}
+
+
+def _records(count: int, invalid=()) -> list:
+
+	return [{'id': str(n) if n in invalid else n} for n in range(count)]
+
+
+def test_validate_json_stream_jsonl_files(tmp_path):
+
+	path = tmp_path / 'records.jsonl'
+	path.write_text('\n'.join(json.dumps(record) for record in _records(1000, invalid={10, 700})) + '\n\n')
+	gz_path = tmp_path / 'records.jsonl.gz'
+	with gzip.open(gz_path, 'wb') as gz_file:
+		gz_file.write(path.read_bytes())
+
+	for source in (str(path), gz_path):
+		report = validate_json_stream(source, RECORD_SCHEMA, workers=0, chunk_size=64)
+		assert (report.records, report.failed) == (1000, 2)
+		assert [failure.offset for failure in report.failures] == [10, 700]
+		assert "`id` '10' is not of type 'integer'" in report.failures[0].error
+
+
+def test_assert_json_stream_array_file_process_pool(tmp_path):
+
+	path = tmp_path / 'records.json'
+	path.write_text(json.dumps(_records(5000, invalid=set(range(100, 5000, 7)))))
+
+	with pytest.raises(AssertionError) as e:
+		assert_json_stream(str(path), RECORD_SCHEMA, workers=2, chunk_size=100, max_failures=3)
+	assert '700 of 5000 JSON records are not valid' in str(e.value)
+	assert '[100]' in str(e.value) and '[107]' in str(e.value) and '[114]' in str(e.value)
+
+	report = assert_json_stream(iter(_records(5000)), JsonMatcher({'id': ANY}), workers=2, chunk_size=1000)
+	assert report.records == 5000
+
+
+def test_validate_json_stream_texts_and_kafka_messages():
+
+	report = validate_json_stream([b'{"id": 1}', '{"id": 2', '[]'], RECORD_SCHEMA, workers=0)
+	assert report.failed == 2
+	assert report.failures[0].offset == 1 and report.failures[0].error.startswith('Invalid JSON')
+
+	# Parsed as with json.loads unless another backend is chosen
+	report = validate_json_stream(['{"id": 123456789012345678901234567890}'], RECORD_SCHEMA, workers=0)
+	assert report.failed == 0
+
+	servers = 'memory://json-stream'
+	consumer = KafkaConsumer(['exports'], bootstrap_servers=servers)
+	KafkaProducer(bootstrap_servers=servers).produce_many('exports', ((None, json.dumps(r)) for r in _records(50, {3})))
+	report = validate_json_stream(consumer, RECORD_SCHEMA, workers=0, chunk_size=20, idle_timeout=0.1)
+	assert (report.records, report.failures[0].offset) == (50, ('exports', 0, 3))
+	consumer.close()
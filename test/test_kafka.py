@@ -0,0 +1,522 @@
+import threading
+import asyncio
+import time
+import json
+from datetime import datetime
+import multiprocessing
+import queue
+import uuid
+import pytest
+from testessera import KafkaMessage, assert_kafka_message
+from testessera import TopicQueue, DROP_NEWEST, BLOCK
+from testessera import LatencyProbe
+from testessera import KafkaConsumer, KafkaProducer, KafkaConsumerPool, MemoryBroker, AsyncKafkaConsumer
+from testessera import Codec, CodecRegistry, JsonCodec, MessagePackCodec, AvroCodec
+from testessera import KafkaVerifier, VerificationReport
+from testessera.kafka_verify import _verify_worker
+from testessera.kafka import PROBE_PRODUCER_HEADER, PROBE_SEQUENCE_HEADER, PROBE_SENT_HEADER
+from testessera.kafka_memory import MemoryMessage
+from confluent_kafka import KafkaError, KafkaException
+
+
+class _Message():
+
+	def __init__(self, value, topic='orders', partition=0, offset=0, headers=None):
+		# pylint: disable=too-many-arguments
+
+		self._value = value
+		self._headers = headers
+		self._topic = topic
+		self._partition = partition
+		self._offset = offset
+
+	def value(self):
+		return self._value
+
+	def key(self):
+		return None
+
+	def headers(self):
+		return self._headers
+
+	def topic(self):
+		return self._topic
+
+	def partition(self):
+		return self._partition
+
+	def offset(self):
+		return self._offset
+
+
+def test_kafka_message_parses_once():
+
+	msg = KafkaMessage(_Message(json.dumps({'event_type': 'OrderCreated'}).encode()))
+
+	assert msg.json is msg.json
+	assert msg.topic() == 'orders'
+
+
+def test_assert_kafka_message_nested_paths():
+
+	msg = KafkaMessage(_Message(json.dumps({'event_type': 'OrderCreated', 'data': {'order': {'id': 5}}})))
+
+	assert_kafka_message(msg, event_type='OrderCreated', **{'data.order.id': 5, '/data/order/id': 5})
+
+	with pytest.raises(AssertionError):
+		assert_kafka_message(msg, **{'data.order.id': 6})
+
+	with pytest.raises(AssertionError):
+		assert_kafka_message(msg, **{'data.customer.id': 5})
+
+
+def test_assert_kafka_message_dotted_top_level_property():
+
+	assert_kafka_message(_Message(json.dumps({'a.b': 1})), **{'a.b': 1})
+
+
+def test_topic_queue_drop_oldest():
+
+	queue = TopicQueue(max_messages=3)
+	for offset in range(5):
+		queue.appendleft(_Message(b'x', offset=offset))
+
+	assert len(queue) == 3
+	assert queue.dropped == 2
+	assert queue.high_water_messages == 3
+	assert [queue.pop().offset() for _ in range(3)] == [2, 3, 4]
+	assert queue.bytes == 0
+
+
+def test_topic_queue_drop_newest_max_bytes():
+
+	queue = TopicQueue(max_bytes=10, policy=DROP_NEWEST)
+	for offset in range(5):
+		queue.appendleft(_Message(b'1234', offset=offset))
+
+	assert len(queue) == 2
+	assert queue.dropped == 3
+	assert queue.high_water_bytes == 8
+	assert queue.pop().offset() == 0
+
+
+def test_topic_queue_block():
+
+	queue = TopicQueue(max_messages=1, policy=BLOCK)
+	queue.appendleft(_Message(b'x', offset=0))
+
+	threading.Timer(0.05, queue.pop).start()
+	queue.appendleft(_Message(b'x', offset=1))
+
+	assert queue.dropped == 0
+	assert queue.pop().offset() == 1
+
+
+def _stamped_message(sequence: int, sent_ns: int) -> _Message:
+
+	return _Message(b'{}', headers=[
+		(PROBE_PRODUCER_HEADER, b'p1'),
+		(PROBE_SEQUENCE_HEADER, str(sequence).encode()),
+		(PROBE_SENT_HEADER, str(sent_ns).encode())
+	])
+
+
+def test_latency_probe_gaps_and_duplicates():
+
+	probe = LatencyProbe()
+	sent_ns = time.time_ns() - 50_000_000
+	for sequence in [0, 1, 3, 4, 4, 2, 5, 8]:
+		probe.observe(_stamped_message(sequence, sent_ns))
+	probe.observe(_Message(b'{}'))
+
+	assert probe.gaps == 2
+	assert probe.duplicates == 1
+	assert probe.latency.count == 8
+	probe.assert_latency(percentile=99, max_seconds=10.0)
+	with pytest.raises(AssertionError):
+		probe.assert_latency(percentile=50, max_seconds=0.01)
+
+
+@pytest.fixture
+def memory_servers():
+	servers = f'memory://{uuid.uuid4().hex}'
+	yield servers
+	MemoryBroker.get(servers).reset()
+
+
+def test_memory_broker_produce_consume(memory_servers):
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+	producer.produce('orders', value=b'{"event_type": "Ignored"}')
+
+	consumer = KafkaConsumer(['orders'], bootstrap_servers=memory_servers)
+	assert consumer.assignment_time is not None
+
+	producer.produce('orders', key='1', value=b'{"event_type": "OrderCreated"}', headers={'trace': 'abc'})
+	msg = consumer.consume_one(timeout=1.0)
+	assert_kafka_message(msg, event_type='OrderCreated')
+	assert msg.key() == b'1'
+	assert msg.headers() == [('trace', b'abc')]
+
+	report = producer.produce_many('orders', ((None, f'{{"n": {n}}}') for n in range(100)))
+	assert report.delivered == 100 and report.undelivered == 0
+
+	msgs = consumer.consume_many(100, timeout=1.0)
+	assert [KafkaMessage(msg).json['n'] for msg in msgs] == list(range(100))
+	assert consumer.consume_one(timeout=0.05) is None
+	consumer.close()
+
+
+def test_memory_producer_rejects_unencoded_values(memory_servers):
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+
+	with pytest.raises(TypeError):
+		producer.produce('orders', value={'n': 1})
+	with pytest.raises(TypeError):
+		producer.produce('orders', value=b'{}', key=1)
+
+
+def test_memory_broker_wakes_waiting_consumer(memory_servers):
+	consumer = KafkaConsumer(['orders'], bootstrap_servers=memory_servers)
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+	threading.Timer(0.1, producer.produce, ('orders',), {'value': b'{}'}).start()
+
+	start = time.monotonic()
+	assert consumer.consume_one(timeout=5.0).value() == b'{}'
+	assert time.monotonic() - start < 2.0
+	consumer.close()
+
+
+def test_memory_broker_consumer_group_splits_partitions(memory_servers):
+	MemoryBroker.get(memory_servers).create_topic('orders', num_partitions=4)
+	config = {'bootstrap.servers': memory_servers, 'group.id': 'group', 'enable.partition.eof': True}
+	first = KafkaConsumer(['orders'], config=config)
+	second = KafkaConsumer(['orders'], config=config)
+	# The first consumer is rebalanced on its next poll
+	assert first.consume_one(timeout=0.05) is None
+
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+	for n in range(8):
+		producer.produce('orders', value=json.dumps({'n': n}).encode(), partition=n % 4)
+
+	first_msgs = first.consume_many(8, timeout=0.1)
+	second_msgs = second.consume_many(8, timeout=0.1)
+	first_partitions = {msg.partition() for msg in first_msgs}
+	second_partitions = {msg.partition() for msg in second_msgs}
+	assert len(first_partitions) == len(second_partitions) == 2
+	assert first_partitions | second_partitions == {0, 1, 2, 3}
+	first.close()
+	second.close()
+
+
+def test_latency_probe_multiple_partitions(memory_servers):
+	MemoryBroker.get(memory_servers).create_topic('orders', num_partitions=3)
+	probe = LatencyProbe()
+	consumer = KafkaConsumer(['orders'], bootstrap_servers=memory_servers, latency_probe=probe)
+	producer = KafkaProducer(bootstrap_servers=memory_servers, latency_probe=True)
+	producer.produce_many('orders', [(None, json.dumps({'n': n}).encode()) for n in range(30)])
+
+	msgs = consumer.consume_many(30, timeout=2.0)
+
+	assert len(msgs) == 30
+	assert {msg.partition() for msg in msgs} == {0, 1, 2}
+	assert (probe.gaps, probe.duplicates, probe.latency.count) == (0, 0, 30)
+	consumer.close()
+
+
+def test_topic_queue_block_times_out_in_consumer(memory_servers):
+	orders_queue = TopicQueue(max_messages=1, policy=BLOCK, block_timeout=0.1)
+	consumer = KafkaConsumer({'orders': orders_queue}, bootstrap_servers=memory_servers)
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+	producer.produce('orders', value=b'{"n": 0}')
+	producer.produce('orders', value=b'{"n": 1}')
+
+	start = time.monotonic()
+	assert len(consumer.consume_many(2, timeout=1.0)) == 2
+	assert time.monotonic() - start < 1.0
+	assert (len(orders_queue), orders_queue.dropped) == (1, 1)
+	assert orders_queue.pop().value() == b'{"n": 0}'
+	consumer.close()
+
+
+def test_consumer_group_rebalance_keeps_positions(memory_servers):
+	MemoryBroker.get(memory_servers).create_topic('orders', num_partitions=2)
+	config = {'bootstrap.servers': memory_servers, 'group.id': 'g'}
+	first = KafkaConsumer(['orders'], config=config)
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+	for n in range(4):
+		producer.produce('orders', value=json.dumps({'n': n}).encode(), partition=n % 2)
+	consumed = [KafkaMessage(first.consume_one(timeout=1.0)).json['n']]
+
+	second = KafkaConsumer(['orders'], config=config)
+	consumed.extend(KafkaMessage(msg).json['n'] for msg in first.consume_many(4, timeout=0.2))
+	consumed.extend(KafkaMessage(msg).json['n'] for msg in second.consume_many(4, timeout=0.2))
+
+	assert sorted(consumed) == [0, 1, 2, 3]
+	first.close()
+	second.close()
+
+
+def test_consume_while_indexing(memory_servers):
+	consumer = KafkaConsumer(['orders'], bootstrap_servers=memory_servers)
+	KafkaProducer(bootstrap_servers=memory_servers).produce('orders', key='a', value=b'{}')
+
+	assert consumer.await_message(key=b'a', timeout=1.0).value() == b'{}'
+	for consume in (consumer.consume_one, consumer.consume_many, consumer.consume_range):
+		with pytest.raises(RuntimeError):
+			consume(0)
+	consumer.close()
+
+
+def test_memory_broker_pool_cursors(memory_servers):
+	pool = KafkaConsumerPool(bootstrap_servers=memory_servers, header_names=['correlation-id'])
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+
+	cursor = pool.cursor(['orders'])
+	producer.produce('orders', value=b'{"n": 1}', headers={'correlation-id': 'a'})
+	later_cursor = pool.cursor(['orders'])
+	producer.produce('orders', value=b'{"n": 2}', headers={'correlation-id': 'b'})
+
+	assert cursor.await_message(header=('correlation-id', b'b'), timeout=1.0).value() == b'{"n": 2}'
+	assert [msg.value() for msg in cursor.consume_many(2, timeout=0.2)] == [b'{"n": 1}', b'{"n": 2}']
+	assert [msg.value() for msg in later_cursor.consume_many(2, timeout=0.2)] == [b'{"n": 2}']
+	pool.close()
+
+
+class _UpperCodec(Codec):
+
+	def __init__(self):
+		self.decoded = 0
+
+	def decode(self, data: bytes):
+		self.decoded += 1
+		return {'text': data.decode().upper()}
+
+	def encode(self, value) -> bytes:
+		return value['text'].encode()
+
+
+def test_codec_registry_lookup():
+	upper = _UpperCodec()
+	codecs = CodecRegistry().register('stock-*', upper)
+
+	assert codecs.codec_for('stock-eu') is upper
+	assert isinstance(codecs.codec_for('orders'), JsonCodec)
+	assert codecs.encode('stock-eu', b'raw') == b'raw'
+	with pytest.raises(LookupError):
+		CodecRegistry(default=None).codec_for('orders')
+
+
+def test_json_codec_backends():
+	data = b'{"id": 123456789012345678901234567890, "ratio": NaN}'
+
+	decoded = JsonCodec().decode(data)
+	assert decoded['id'] == 123456789012345678901234567890 and decoded['ratio'] != decoded['ratio']
+	assert str(JsonCodec()) == 'JsonCodec(json)'
+	with pytest.raises(ValueError):
+		JsonCodec(backend='simplejson')
+
+	pytest.importorskip('orjson')
+	orjson_codec = JsonCodec(backend='orjson')
+	assert orjson_codec.decode(orjson_codec.encode({'n': 1})) == {'n': 1}
+
+
+def test_consumer_codecs_decode_lazily(memory_servers):
+	upper = _UpperCodec()
+	codecs = CodecRegistry().register('stock', upper)
+	producer = KafkaProducer(bootstrap_servers=memory_servers, codecs=codecs)
+	consumer = KafkaConsumer(['stock', 'orders'], bootstrap_servers=memory_servers, codecs=codecs)
+
+	producer.produce_many('stock', ((None, {'text': f'item {n}'}) for n in range(10)))
+	producer.produce('orders', value={'event_type': 'OrderCreated'})
+
+	msgs = consumer.consume_many(11, timeout=1.0)
+	assert len(msgs) == 11 and upper.decoded == 0
+	stock = [msg for msg in msgs if msg.topic() == 'stock']
+	orders = [msg for msg in msgs if msg.topic() == 'orders']
+	assert stock[3].value() == b'item 3'
+	assert_kafka_message(stock[3], text='ITEM 3')
+	assert_kafka_message(orders[0], event_type='OrderCreated')
+	assert upper.decoded == 1
+	consumer.close()
+
+
+def test_message_pack_codec():
+	pytest.importorskip('msgpack')
+	codec = MessagePackCodec()
+
+	msg = _Message(codec.encode({'data': {'id': 5}}))
+	assert_kafka_message(msg, codec=codec, **{'data.id': 5})
+
+
+def test_avro_codec_schema_file(tmp_path):
+	pytest.importorskip('fastavro')
+	schema_path = tmp_path / 'order.avsc'
+	schema_path.write_text(json.dumps({
+		'type': 'record', 'name': 'Order', 'fields': [{'name': 'id', 'type': 'long'}, {'name': 'event_type', 'type': 'string'}]
+	}))
+	codec = AvroCodec(str(schema_path), schema_id=7)
+
+	assert AvroCodec(str(schema_path)).schema is codec.schema
+	value = codec.encode({'id': 5, 'event_type': 'OrderCreated'})
+	assert value[:5] == b'\x00\x00\x00\x00\x07'
+	assert_kafka_message(_Message(value), codec=codec, id=5, event_type='OrderCreated')
+	with pytest.raises(ValueError):
+		AvroCodec(str(schema_path), schema_id=8).decode(value)
+
+
+def _check_even(msg: KafkaMessage):
+	assert msg.json['n'] % 2 == 0, f'{msg.json["n"]} is odd'
+
+
+def _start_verify_worker(index, memory_servers, results, stop, counter) -> threading.Thread:
+
+	worker = threading.Thread(target=_verify_worker, args=(
+		index, ['orders'], _check_even, memory_servers, 'verifier', None, None, 3, 100, results, stop, counter
+	))
+	worker.start()
+	return worker
+
+
+def test_verify_worker_reports(memory_servers):
+	MemoryBroker.get(memory_servers).create_topic('orders', num_partitions=2)
+	results = queue.Queue()
+	stop = threading.Event()
+	counter = multiprocessing.Value('q', 0)
+	workers = [_start_verify_worker(0, memory_servers, results, stop, counter)]
+	assert results.get(timeout=5.0) == ('assigned', (0, frozenset({('orders', 0), ('orders', 1)})))
+
+	KafkaProducer(bootstrap_servers=memory_servers).produce_many('orders', ((None, f'{{"n": {n}}}') for n in range(20)))
+	# A worker joining rebalances the group, and no message is lost
+	workers.append(_start_verify_worker(1, memory_servers, results, stop, counter))
+	deadline = time.monotonic() + 5.0
+	while counter.value < 20 and time.monotonic() < deadline:
+		time.sleep(0.01)
+	stop.set()
+	for worker in workers:
+		worker.join()
+
+	report = VerificationReport(max_failures=5)
+	while not results.empty():
+		kind, payload = results.get()
+		if kind == 'report':
+			report.merge(payload)
+
+	assert (report.passed, report.failed, len(report.workers)) == (10, 10, 2)
+	assert report.failures and all(int(failure.error.split()[0]) % 2 for failure in report.failures)
+	with pytest.raises(AssertionError, match='10 of 20 Kafka messages failed'):
+		report.assert_passed()
+
+
+def test_kafka_verifier_settled_group():
+	verifier = KafkaVerifier(['orders'], _check_even, processes=2)
+	p0, p1 = ('orders', 0), ('orders', 1)
+
+	assert not verifier._settled({0: frozenset({p0, p1})}, {p0, p1})
+	assert not verifier._settled({0: frozenset({p0, p1}), 1: frozenset({p1})}, {p0, p1})
+	assert not verifier._settled({0: frozenset(), 1: frozenset({p1})}, {p0, p1})
+	assert verifier._settled({0: frozenset({p0}), 1: frozenset({p1})}, {p0, p1})
+
+
+def test_kafka_verifier_processes():
+	# Worker processes have their own in-process broker, so no message is verified
+	with KafkaVerifier(['orders'], _check_even, processes=1, bootstrap_servers='memory://') as verifier:
+		report = verifier.wait(idle_timeout=0.2)
+
+	assert len(report.workers) == 1
+	assert report.errors == []
+	with pytest.raises(AssertionError, match='Expected at least 1 Kafka messages'):
+		report.assert_passed()
+
+
+def test_consumer_seek_and_consume_range(memory_servers):
+	MemoryBroker.get(memory_servers).create_topic('orders', num_partitions=2)
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+	for n in range(10):
+		timestamp = 1_700_000_000_000 + n * 1000
+		producer.produce('orders', value=json.dumps({'n': n}).encode(), partition=n % 2, timestamp=timestamp)
+
+	consumer = KafkaConsumer(['orders'], bootstrap_servers=memory_servers)
+	assert consumer.consume_one(timeout=0.05) is None
+
+	offsets = consumer.seek_to_time(1_700_000_006.0)
+	assert offsets == {('orders', 0): 3, ('orders', 1): 3}
+	assert sorted(KafkaMessage(msg).json['n'] for msg in consumer.consume_many(10, timeout=0.1)) == [6, 7, 8, 9]
+
+	consumer.seek_to_offset(4, partition=1)
+	assert KafkaMessage(consumer.consume_one(timeout=1.0)).json['n'] == 9
+
+	msgs = consumer.consume_range(1, datetime.fromtimestamp(1_700_000_005.0), timeout=1.0)
+	assert sorted(KafkaMessage(msg).json['n'] for msg in msgs) == [2, 3, 4]
+	# Partitions are left at the end of the range
+	assert sorted(KafkaMessage(msg).json['n'] for msg in consumer.consume_many(10, timeout=0.1)) == [5, 6, 7, 8, 9]
+
+	assert len(consumer.consume_range(0, timeout=1.0)) == 10
+	assert consumer.consume_one(timeout=0.05) is None
+	consumer.close()
+
+
+def test_consume_range_keeps_other_topics(memory_servers):
+	consumer = KafkaConsumer(['orders', 'stock'], bootstrap_servers=memory_servers)
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+	for n in range(3):
+		producer.produce('orders', value=json.dumps({'n': n}).encode())
+		producer.produce('stock', value=json.dumps({'n': n}).encode())
+
+	assert len(consumer.consume_range(0, topic='orders', timeout=1.0)) == 3
+
+	msgs = consumer.consume_many(10, timeout=0.5)
+	assert [(msg.topic(), KafkaMessage(msg).json['n']) for msg in msgs] == [('stock', 0), ('stock', 1), ('stock', 2)]
+	consumer.close()
+
+
+def test_async_kafka_consumer(memory_servers):
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+
+	async def run():
+		async with AsyncKafkaConsumer(['orders'], bootstrap_servers=memory_servers) as consumer:
+			assert await consumer.consume_one(timeout=0.1) is None
+
+			producer.produce('orders', value=b'{"n": 0}')
+			assert (await consumer.consume_one(timeout=2.0)).value() == b'{"n": 0}'
+
+			for n in range(1, 4):
+				producer.produce('orders', value=f'{{"n": {n}}}'.encode())
+			msgs = await consumer.consume_many(3, timeout=2.0)
+			assert [msg.value() for msg in msgs] == [b'{"n": 1}', b'{"n": 2}', b'{"n": 3}']
+
+			producer.produce('orders', value=b'{"n": 4}')
+			asyncio.get_running_loop().call_later(0.2, asyncio.ensure_future, consumer.aclose())
+			return [msg.value() async for msg in consumer]
+
+	assert asyncio.run(asyncio.wait_for(run(), 10.0)) == [b'{"n": 4}']
+
+
+def test_async_kafka_consumer_max_queued(memory_servers):
+	producer = KafkaProducer(bootstrap_servers=memory_servers)
+
+	async def run():
+		async with AsyncKafkaConsumer(['orders'], bootstrap_servers=memory_servers, max_queued=2) as consumer:
+			for n in range(5):
+				producer.produce('orders', value=f'{{"n": {n}}}'.encode())
+			await asyncio.sleep(0.3)
+			assert consumer._queue.qsize() == 2	# pylint: disable=protected-access
+			msgs = await consumer.consume_many(5, timeout=2.0)
+			assert [KafkaMessage(msg).json['n'] for msg in msgs] == [0, 1, 2, 3, 4]
+
+	asyncio.run(asyncio.wait_for(run(), 10.0))
+
+
+def test_async_kafka_consumer_error(memory_servers):
+
+	async def run():
+		async with AsyncKafkaConsumer(['orders'], bootstrap_servers=memory_servers) as consumer:
+			error = MemoryMessage(
+				'orders', 0, -1, value=b'Broker transport failure',
+				error=KafkaError(KafkaError._TRANSPORT)	# pylint: disable=protected-access
+			)
+			consumer.consumer.consumer.poll = lambda timeout=None: error
+			for _ in range(2):
+				with pytest.raises(KafkaException):
+					await consumer.consume_one(timeout=2.0)
+
+	asyncio.run(asyncio.wait_for(run(), 10.0))
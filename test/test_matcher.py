@@ -0,0 +1,81 @@
+import pytest
+from testessera import JsonMatcher, ANY, Regex, Approx, Unordered, assert_json
+
+
+ORDER = {
+	'id': 5,
+	'status': 'CREATED',
+	'reference': 'ORD-00000005',
+	'total': 99.899,
+	'paid': False,
+	'lines': [{'sku': 'B2', 'quantity': 1}, {'sku': 'A1', 'quantity': 3}],
+	'customer': {'id': 7, 'name': 'Jane'}
+}
+
+
+def test_json_matcher_subset():
+
+	matcher = JsonMatcher({
+		'id': ANY,
+		'status': 'CREATED',
+		'reference': Regex(r'ORD-[0-9]{8}'),
+		'total': Approx(99.9, abs_tol=0.01),
+		'paid': False,
+		'lines': Unordered([{'sku': 'A1'}, {'sku': 'B2'}]),
+		'customer': {'id': 7}
+	})
+
+	assert matcher.matches(ORDER)
+	assert_json(ORDER, matcher)
+	assert matcher.assert_all([ORDER] * 1000) == 1000
+
+
+def test_json_matcher_failures():
+
+	matcher = JsonMatcher({
+		'id': 6,
+		'paid': 0,
+		'reference': Regex(r'ORD-[0-9]{4}'),
+		'customer': {'id': 7, 'email': ANY},
+		'lines': [{'sku': 'B2'}],
+		'missing': {'nested': 1}
+	})
+
+	assert matcher.match(ORDER) == ['`id` expected 6 but got 5']
+	assert matcher.match(ORDER, max_failures=10) == [
+		'`id` expected 6 but got 5',
+		'`paid` expected 0 but got False',
+		"`reference` expected a string matching 'ORD-[0-9]{4}' but got 'ORD-00000005'",
+		'`customer.email` is missing',
+		'`lines` expected 1 items but got 2',
+		'`missing` is missing'
+	]
+	with pytest.raises(AssertionError, match='`id` expected 6 but got 5'):
+		assert_json(ORDER, matcher)
+
+
+def test_json_matcher_unordered():
+
+	matcher = JsonMatcher(Unordered([{'n': ANY}, {'n': 1}]))
+
+	# The first pattern must not take the only item matching the second one
+	assert matcher.matches([{'n': 1}, {'n': 2}])
+	assert matcher.match([{'n': 2}, {'n': 3}]) == ["`$` has no match for expected item {'n': 1}"]
+	assert not matcher.matches([{'n': 1}, {'n': 2}, {'n': 3}])
+	assert JsonMatcher(Unordered([1], subset=True)).matches([3, 2, 1])
+
+
+def test_json_matcher_assert_all_bounded():
+
+	matcher = JsonMatcher({'n': Approx(0, abs_tol=0.5)})
+
+	with pytest.raises(AssertionError) as e:
+		matcher.assert_all(({'n': n} for n in range(1000)), max_failures=3)
+	assert str(e.value).count('expected Approx') == 3
+	assert '[3] `n`' in str(e.value)
+
+
+def test_patterns_compare_equal():
+
+	assert {'id': 5, 'reference': 'ORD-1'} == {'id': ANY, 'reference': Regex(r'ORD-\d+')}
+	assert [0.1 + 0.2] == [Approx(0.3)]
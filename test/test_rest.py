@@ -0,0 +1,263 @@
+from urllib.parse import quote
+import asyncio
+import pytest
+from testessera import RestClient, RestRequest, assert_rest_response, assert_rest_response_stream, run_load
+from testessera import AsyncRestClient
+from testessera import Cassette, CassetteMissError, RECORD, REPLAY
+from testessera import MetricsRegistry, default_registry, assert_eventually
+from testessera import LinkHeaderPagination, CursorPagination, OffsetPagination
+
+
+def test_request_many_ordered(base_url):
+
+	client = RestClient(base_url)
+
+	results = list(client.request_many((RestRequest('GET', f'/items/{i}') for i in range(50)), max_workers=4))
+
+	assert [result.index for result in results] == list(range(50))
+	for i, result in enumerate(results):
+		assert result.ok
+		assert result.elapsed > 0
+		assert_rest_response(result.response, 200, json_instance={'path': f'/items/{i}'})
+
+
+def test_request_many_unordered_failures_per_item(base_url):
+
+	client = RestClient(base_url)
+	rest_requests = [RestRequest('GET', '/fail' if i == 3 else f'/items/{i}') for i in range(10)]
+
+	results = list(client.request_many(rest_requests, max_workers=3, ordered=False))
+
+	assert sorted(result.index for result in results) == list(range(10))
+	failed = [result for result in results if not result.ok]
+	assert [result.index for result in failed] == [3]
+	assert failed[0].response is None
+
+
+def test_run_load_open_loop(base_url):
+
+	client = RestClient(base_url)
+
+	report = run_load(client, lambda: RestRequest('GET', '/items/1'), rps=100, duration=0.5,
+		max_workers=8, assert_kwargs={'status_code': 200})
+
+	assert report.requests == 50
+	assert report.status_codes[200] == 50
+	assert report.error_rate == 0.0
+	assert report.assertion_failures == 0
+	assert report.latency.count == 50
+	assert report.latency.percentile(50) <= report.latency.max
+
+
+def test_run_load_assertion_failures(base_url):
+
+	client = RestClient(base_url)
+
+	report = run_load(client, lambda: RestRequest('GET', '/items/1'), rps=100, duration=0.2,
+		assert_kwargs={'status_code': 201}, max_assertion_errors=3)
+
+	assert report.assertion_failures == 20
+	assert len(report.first_assertion_errors) == 3
+
+
+def test_request_query_params_encoded(base_url):
+
+	client = RestClient(base_url)
+
+	response = client.request(RestRequest('GET', '/search', query_params={'q': 'a b&c', 'tag': ['x', 'y']}))
+
+	assert_rest_response(response, 200, json_instance={'path': '/search?q=a+b%26c&tag=x&tag=y'})
+
+
+def test_template_path_params(base_url):
+
+	client = RestClient(base_url)
+	breed_get = client.template(RestRequest('GET', '/breeds/{breed_id}', query_params={'limit': 1}))
+
+	for breed_id in ['abys', 'a/b c']:
+		response = breed_get.request(breed_id=breed_id)
+		assert_rest_response(response, 200, json_instance={'path': f'/breeds/{quote(breed_id, safe="")}?limit=1'})
+
+
+def test_template_static_body_and_body_fields(base_url):
+
+	client = RestClient(base_url, api_key='secret')
+	order_post = client.template(RestRequest('POST', '/orders', body={'item': 'book', 'quantity': 1}))
+
+	response = order_post.request()
+	assert_rest_response(response, 201, json_instance={
+		'path': '/orders', 'body': {'item': 'book', 'quantity': 1}, 'api_key': 'secret'
+	})
+
+	response = order_post.request(body_fields={'quantity': 3})
+	assert_rest_response(response, 201, json_instance={
+		'path': '/orders', 'body': {'item': 'book', 'quantity': 3}, 'api_key': 'secret'
+	})
+	assert order_post.rest_request.body == {'item': 'book', 'quantity': 1}
+
+
+def test_cassette_record_replay(base_url, tmp_path):
+
+	path = str(tmp_path / 'cassette')
+	with Cassette(path, RECORD) as cassette:
+		client = RestClient(base_url, cassette=cassette)
+		client.request(RestRequest('GET', '/items/1', query_params={'b': 2, 'a': 1}))
+		client.request(RestRequest('POST', '/orders', body={'item': 'book'}))
+
+	with Cassette(path, REPLAY) as cassette:
+		client = RestClient(base_url, cassette=cassette)
+		client._session = None	# pylint: disable=protected-access
+
+		response = client.request(RestRequest('GET', '/items/1', query_params={'a': 1, 'b': 2}))
+		assert_rest_response(response, 200, json_instance={'path': '/items/1?b=2&a=1'})
+
+		response = client.request(RestRequest('POST', '/orders', body={'item': 'book'}))
+		assert_rest_response(response, 201, json_schema={'type': 'object', 'required': ['body']})
+
+		with pytest.raises(CassetteMissError):
+			client.request(RestRequest('POST', '/orders', body={'item': 'pen'}))
+
+
+def test_cassette_replay_stream(base_url, tmp_path):
+
+	path = str(tmp_path / 'cassette')
+	with Cassette(path, RECORD) as cassette:
+		RestClient(base_url, cassette=cassette).request(RestRequest('GET', '/export'))
+
+	with Cassette(path, REPLAY) as cassette:
+		client = RestClient(base_url, cassette=cassette)
+
+		response = client.request(RestRequest('GET', '/export'), stream=True)
+		assert assert_rest_response_stream(response, 200, item_schema={'type': 'object'}, chunk_size=64) == 1000
+
+		with client.request(RestRequest('GET', '/export'), stream=True) as response:
+			assert response.raw.read(1) == b'['
+		response.close()
+
+
+def test_assert_rest_response_stream(base_url):
+
+	client = RestClient(base_url)
+
+	response = client.request(RestRequest('GET', '/export'), stream=True)
+	num_items = assert_rest_response_stream(response, 200, item_schema={'type': 'object'}, chunk_size=64)
+
+	assert num_items == 1000
+
+
+def test_assert_rest_response_stream_item_failure(base_url):
+
+	client = RestClient(base_url)
+
+	response = client.request(RestRequest('GET', '/export'), stream=True)
+	with pytest.raises(AssertionError, match='Item 500'):
+		assert_rest_response_stream(response, 200, item_schema={
+			'type': 'object', 'properties': {'id': {'type': 'integer'}}
+		})
+
+
+def test_metrics_labeled_by_path_template(base_url):
+
+	metrics = MetricsRegistry()
+	client = RestClient(base_url, metrics=metrics)
+
+	for item_id in range(3):
+		client.request(RestRequest('GET', f'/items/{item_id}', path_template='/items/{item_id}'))
+
+	labels = {'method': 'GET', 'path': '/items/{item_id}'}
+	assert metrics.counter('testessera_rest_requests_total', status='200', **labels).value == 3
+	assert metrics.histogram('testessera_rest_total_seconds', **labels).count == 3
+	assert metrics.histogram('testessera_rest_ttfb_seconds', **labels).count == 3
+	assert metrics.histogram('testessera_rest_body_seconds', **labels).count == 3
+	assert metrics.histogram('testessera_rest_connect_seconds', **labels).count >= 1
+
+	prometheus = metrics.to_prometheus()
+	assert 'testessera_rest_requests_total{method="GET",path="/items/{item_id}",status="200"} 3' in prometheus
+	assert '# TYPE testessera_rest_total_seconds summary' in prometheus
+	assert metrics.to_dict()['testessera_rest_total_seconds'][0]['count'] == 3
+
+
+def test_metrics_opt_in(base_url):
+
+	client = RestClient(base_url)
+	client.get('/items/1')
+
+	assert client.metrics is None
+	assert not default_registry.to_dict()
+
+
+def test_assert_eventually(base_url):
+
+	client = RestClient(base_url, metrics=MetricsRegistry())
+
+	convergence = assert_eventually(client, RestRequest('GET', '/eventually/3'), timeout=5.0,
+		initial_interval=0.01, status_code=200)
+
+	assert convergence.attempts == 3
+	assert convergence.elapsed > 0
+	assert_rest_response(convergence.response, 200)
+	assert client.metrics.histogram('testessera_rest_convergence_seconds', method='GET', path='/eventually/3').count == 1
+
+
+def test_assert_eventually_timeout(base_url):
+
+	client = RestClient(base_url)
+
+	with pytest.raises(AssertionError, match='404'):
+		assert_eventually(client, RestRequest('GET', '/eventually/1000'), timeout=0.2,
+			initial_interval=0.01, status_code=200)
+
+
+@pytest.mark.parametrize('path, strategy', [
+	('/pages/link', LinkHeaderPagination()),
+	('/pages/cursor', CursorPagination()),
+	('/pages/offset', OffsetPagination(limit=10))
+])
+def test_paginate(base_url, path, strategy):
+
+	client = RestClient(base_url)
+
+	items = list(client.paginate(RestRequest('GET', path), strategy, prefetch=2))
+
+	assert items == list(range(95))
+
+
+def test_paginate_max_pages_and_early_close(base_url):
+
+	client = RestClient(base_url)
+
+	assert list(client.paginate(RestRequest('GET', '/pages/link'), max_pages=2)) == list(range(20))
+
+	pages = client.paginate(RestRequest('GET', '/pages/cursor'), CursorPagination())
+	assert next(pages) == 0
+	pages.close()
+
+	with pytest.raises(ValueError):
+		next(client.paginate(RestRequest('GET', '/pages/link'), prefetch=0))
+
+
+def test_async_rest_client_gather(base_url):
+
+	async def run():
+		async with AsyncRestClient(base_url, max_connections=4) as client:
+			return await asyncio.gather(
+				*(client.request(RestRequest('GET', f'/items/{item_id}', query_params={'a': 1})) for item_id in range(10))
+			)
+
+	responses = asyncio.run(run())
+
+	for item_id, response in enumerate(responses):
+		assert_rest_response(response, 200, json_instance={'path': f'/items/{item_id}?a=1'})
+
+
+def test_async_rest_client_post_api_key(base_url):
+
+	async def run():
+		async with AsyncRestClient(base_url, api_key='secret') as client:
+			return await client.post('/orders', {'item': 'book'}, headers={'X-Request-Id': '1'})
+
+	response = asyncio.run(run())
+
+	assert_rest_response(response, 201, json_instance={'path': '/orders', 'body': {'item': 'book'}, 'api_key': 'secret'})
+	with pytest.raises(AssertionError):
+		assert_rest_response(response, 200)
@@ -1,17 +1,54 @@
-from testessera.json import assert_json
+from testessera.json import (
+	assert_json,
+	iter_json_array,
+	compile_json_path,
+	get_json_path,
+	schema_validator_cache
+)
+from testessera.json_stream import assert_json_stream, validate_json_stream, JsonStreamReport, JsonStreamFailure
+from testessera.matcher import JsonMatcher, JsonPattern, ANY, Regex, Approx, Unordered
+from testessera.cassette import Cassette, CassetteMissError, RECORD, REPLAY
+from testessera.pagination import (
+	Pagination,
+	LinkHeaderPagination,
+	CursorPagination,
+	OffsetPagination
+)
 from testessera.rest import (
 	RestRequest,
 	RestClient,
+	RestResult,
+	RestRequestTemplate,
+	Convergence,
 	assert_http_response,
 	assert_rest_response,
+	assert_rest_response_stream,
+	assert_eventually,
 	assert_problem_json_response
 )
+from testessera.rest_async import AsyncRestClient
+from testessera.histogram import LatencyHistogram
+from testessera.metrics import MetricsRegistry, default_registry
+from testessera.load import LoadReport, run_load
 from testessera.kafka import (
 	KafkaConsumer,
 	KafkaProducer,
+	KafkaMessage,
+	LatencyProbe,
+	TopicQueue,
+	DROP_OLDEST,
+	DROP_NEWEST,
+	BLOCK,
+	KafkaConsumerPool,
+	KafkaCursor,
+	DeliveryReport,
 	assert_kafka_message,
 	assert_no_kafka_message
 )
+from testessera.kafka_async import AsyncKafkaConsumer
+from testessera.kafka_memory import MemoryBroker
+from testessera.kafka_codecs import Codec, CodecRegistry, JsonCodec, MessagePackCodec, AvroCodec
+from testessera.kafka_verify import KafkaVerifier, VerificationReport, VerificationFailure
 
 VERSION = '0.0.1'
 """Testessera package version. """
@@ -0,0 +1,201 @@
+"""Provides record/replay of `RestClient` interactions.
+
+A cassette is a directory with two files:
+
+- `bodies.bin`:	Response bodies, concatenated.
+- `index.json`:	Responses keyed by method, normalized URL and request body hash, with the
+	offset and length of their body in `bodies.bin`.
+
+On replay the index is loaded into a dict and `bodies.bin` is memory-mapped, so opening
+a large cassette is instant and lookups are O(1).
+
+"""
+from datetime import timedelta
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import threading
+import hashlib
+import mmap
+import json
+import io
+import os
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+RECORD = 'record'
+"""str: Cassette mode that sends requests and records their responses. """
+
+REPLAY = 'replay'
+"""str: Cassette mode that serves recorded responses without touching the network. """
+
+_INDEX_FILE = 'index.json'
+_BODIES_FILE = 'bodies.bin'
+_INDEX_VERSION = 1
+
+# Recorded bodies are already decoded by `requests`
+_DROPPED_HEADERS = ('Content-Encoding', 'Transfer-Encoding', 'Content-Length')
+
+
+class CassetteMissError(requests.RequestException):
+	"""No recorded response matches the request being replayed. """
+
+
+class Cassette():
+	"""On-disk archive of REST interactions.
+
+	If the same request is recorded several times its responses are replayed in the same
+	order. Once exhausted, the last response is replayed again.
+
+	Attributes:
+		path (str):	Cassette directory.
+		mode (str):	`RECORD` or `REPLAY`.
+
+	Example:
+
+		..sourcecode ::
+
+			with Cassette('cassettes/breeds', RECORD) as cassette:
+				client = TheCatApiClient()
+				client.cassette = cassette
+				client.request(BreedGet(breed_id='abys'))
+
+	"""
+	def __init__(self, path: str, mode: str = REPLAY):
+		"""
+
+		Raises:
+			ValueError:		Unknown `mode`.
+			FileNotFoundError:	Replaying a cassette that does not exist.
+
+		"""
+		if mode not in (RECORD, REPLAY):
+			raise ValueError(f'Unknown cassette mode `{mode}`')
+
+		self.path = path
+		self.mode = mode
+		self._lock = threading.Lock()
+		self._replay_positions = {}
+		self._bodies = None
+		self._bodies_file = None
+
+		if mode == RECORD:
+			os.makedirs(path, exist_ok=True)
+			self._interactions = {}
+			self._bodies_file = open(os.path.join(path, _BODIES_FILE), 'wb')	# pylint: disable=consider-using-with
+			self._offset = 0
+		else:
+			with open(os.path.join(path, _INDEX_FILE), encoding='utf-8') as index_file:
+				self._interactions = json.load(index_file)['interactions']
+			self._bodies_file = open(os.path.join(path, _BODIES_FILE), 'rb')	# pylint: disable=consider-using-with
+			if os.fstat(self._bodies_file.fileno()).st_size:
+				self._bodies = mmap.mmap(self._bodies_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+	def __enter__(self):
+
+		return self
+
+	def __exit__(self, *exc_info):
+
+		self.close()
+
+	def __len__(self):
+
+		return sum(len(responses) for responses in self._interactions.values())
+
+	def record(self, prepared_request: requests.PreparedRequest, response: requests.Response):
+		"""Appends `response` to the cassette. """
+
+		key = self.key(prepared_request)
+		content = response.content
+		headers = {
+			name: value for name, value in response.headers.items() if name not in _DROPPED_HEADERS
+		}
+
+		with self._lock:
+			self._bodies_file.write(content)
+			self._interactions.setdefault(key, []).append({
+				'status_code': response.status_code,
+				'reason': response.reason,
+				'url': response.url,
+				'headers': headers,
+				'offset': self._offset,
+				'length': len(content)
+			})
+			self._offset += len(content)
+
+	def replay(self, prepared_request: requests.PreparedRequest) -> requests.Response:
+		"""Returns the recorded response of `prepared_request`.
+
+		Raises:
+			CassetteMissError:	The request was not recorded.
+
+		"""
+		key = self.key(prepared_request)
+		recorded = self._interactions.get(key)
+		if not recorded:
+			raise CassetteMissError(f'No recorded response for {key}', request=prepared_request)
+
+		with self._lock:
+			position = self._replay_positions.get(key, 0)
+			self._replay_positions[key] = position + 1
+		interaction = recorded[min(position, len(recorded) - 1)]
+
+		offset, length = interaction['offset'], interaction['length']
+		response = requests.Response()
+		response.status_code = interaction['status_code']
+		response.reason = interaction['reason']
+		response.url = interaction['url']
+		response.headers = CaseInsensitiveDict(interaction['headers'])
+		response.headers['Content-Length'] = str(length)
+		response.encoding = get_encoding_from_headers(response.headers)
+		body = self._bodies[offset:offset + length] if length else b''
+		# The body is already read, so closing and streaming the response use `_content`
+		response._content = body	# pylint: disable=protected-access
+		response._content_consumed = True	# pylint: disable=protected-access
+		response.raw = io.BytesIO(body)
+		response.request = prepared_request
+		response.elapsed = timedelta(0)
+
+		return response
+
+	def save(self):
+		"""Writes the index of a recording cassette. """
+
+		if self.mode != RECORD:
+			return
+
+		with self._lock:
+			self._bodies_file.flush()
+			with open(os.path.join(self.path, _INDEX_FILE), 'w', encoding='utf-8') as index_file:
+				json.dump({'version': _INDEX_VERSION, 'interactions': self._interactions}, index_file)
+
+	def close(self):
+		"""Saves a recording cassette and releases the files. """
+
+		self.save()
+		if self._bodies is not None:
+			self._bodies.close()
+			self._bodies = None
+		if self._bodies_file is not None:
+			self._bodies_file.close()
+			self._bodies_file = None
+
+	@staticmethod
+	def key(prepared_request: requests.PreparedRequest) -> str:
+		"""Returns the index key of `prepared_request`.
+
+		It is composed by the method, the URL with lowercase scheme and host, sorted query
+		parameters and no fragment, and the SHA-256 of the body.
+
+		"""
+		scheme, netloc, path, query, _ = urlsplit(prepared_request.url)
+		query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+		url = urlunsplit((scheme.lower(), netloc.lower(), path, query, ''))
+
+		body = prepared_request.body or b''
+		if isinstance(body, str):
+			body = body.encode('utf-8')
+		body_hash = hashlib.sha256(body).hexdigest()
+
+		return f'{prepared_request.method} {url} {body_hash}'
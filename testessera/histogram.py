@@ -0,0 +1,136 @@
+"""Provides a latency histogram with bounded relative error.
+
+"""
+from typing import Optional
+import threading
+
+
+class LatencyHistogram():
+	"""HDR-style latency histogram.
+
+	Latencies are recorded in microseconds into log-linear buckets: every power of two is
+	split into `2 ** (significant_bits - 1)` linear sub-buckets, so the relative error of
+	any reported value is below `2 ** -(significant_bits - 1)` (<1% with the default 8 bits)
+	while memory grows only with the logarithm of the recorded range.
+
+	Reported values are the highest value equivalent to the bucket, as in HdrHistogram.
+
+	"""
+	def __init__(self, significant_bits: int = 8):
+
+		self._bits = significant_bits
+		self._counts = {}
+		self._count = 0
+		self._sum = 0
+		self._min = None
+		self._max = 0
+		self._lock = threading.Lock()
+
+	def record(self, seconds: float):
+		"""Records a latency given in seconds. """
+
+		self.record_us(int(seconds * 1_000_000))
+
+	def record_us(self, value: int):
+		"""Records a latency given in microseconds. """
+
+		value = max(value, 0)
+		index = self._index(value)
+		with self._lock:
+			self._counts[index] = self._counts.get(index, 0) + 1
+			self._count += 1
+			self._sum += value
+			if self._min is None or value < self._min:
+				self._min = value
+			if value > self._max:
+				self._max = value
+
+	def merge(self, other: 'LatencyHistogram'):
+		"""Adds the values recorded in `other` to this histogram. """
+
+		if other._bits != self._bits:	# pylint: disable=protected-access
+			raise ValueError('Cannot merge histograms with different significant bits')
+
+		with other._lock:	# pylint: disable=protected-access
+			counts = dict(other._counts)	# pylint: disable=protected-access
+			count, total, minimum, maximum = other._count, other._sum, other._min, other._max	# pylint: disable=protected-access
+
+		with self._lock:
+			for index, bucket_count in counts.items():
+				self._counts[index] = self._counts.get(index, 0) + bucket_count
+			self._count += count
+			self._sum += total
+			if minimum is not None and (self._min is None or minimum < self._min):
+				self._min = minimum
+			self._max = max(self._max, maximum)
+
+	@property
+	def count(self) -> int:
+		"""Number of recorded values. """
+
+		return self._count
+
+	@property
+	def max(self) -> float:
+		"""Exact maximum recorded latency in seconds. """
+
+		return self._max / 1_000_000
+
+	@property
+	def min(self) -> Optional[float]:
+		"""Exact minimum recorded latency in seconds, or None if empty. """
+
+		return None if self._min is None else self._min / 1_000_000
+
+	@property
+	def mean(self) -> float:
+		"""Mean recorded latency in seconds. """
+
+		return self._sum / self._count / 1_000_000 if self._count else 0.0
+
+	def percentile(self, percentile: float) -> float:
+		"""Returns the latency in seconds at `percentile` (0-100). """
+
+		with self._lock:
+			if not self._count:
+				return 0.0
+			rank = max(1, int(percentile / 100 * self._count + 0.5))
+			seen = 0
+			for index in sorted(self._counts):
+				seen += self._counts[index]
+				if seen >= rank:
+					return min(self._highest_equivalent(index), self._max) / 1_000_000
+
+		return self.max
+
+	def summary(self) -> dict:
+		"""Returns count, mean, p50, p90, p99, p99.9 and max latencies in seconds. """
+
+		return {
+			'count': self.count,
+			'mean': self.mean,
+			'p50': self.percentile(50),
+			'p90': self.percentile(90),
+			'p99': self.percentile(99),
+			'p99.9': self.percentile(99.9),
+			'max': self.max
+		}
+
+	def _index(self, value: int) -> int:
+
+		shift = max(value.bit_length() - self._bits, 0)
+		return (shift << self._bits) | (value >> shift)
+
+	def _highest_equivalent(self, index: int) -> int:
+
+		shift = index >> self._bits
+		mantissa = index & ((1 << self._bits) - 1)
+		return ((mantissa + 1) << shift) - 1
+
+	def __str__(self):
+		summary = self.summary()
+		return (
+			f'LatencyHistogram(count={summary["count"]}, p50={summary["p50"] * 1000:.3f}ms,'
+			f' p90={summary["p90"] * 1000:.3f}ms, p99={summary["p99"] * 1000:.3f}ms,'
+			f' p99.9={summary["p99.9"] * 1000:.3f}ms, max={summary["max"] * 1000:.3f}ms)'
+		)
@@ -1,19 +1,158 @@
+from typing import Iterable, Iterator, Union
+from collections import OrderedDict, namedtuple
+import functools
+import threading
+import copy
+import codecs
+import hashlib
+import json
 import jsonschema
+from testessera.matcher import JsonMatcher
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class SchemaValidatorCache():
+	"""LRU cache of compiled JSON schema validators.
+
+	Validators are keyed by a canonical hash of the schema, so equal schemas built
+	independently share the same validator. The schema is checked against its meta-schema
+	only once, when its validator is compiled. Schemas passed again as the same object
+	skip the hash: they are only compared with the copy their validator was built from.
+
+	Attributes:
+		maxsize (int):	Maximum number of cached validators.
+
+	"""
+	def __init__(self, maxsize: int = 128):
+
+		self.maxsize = maxsize
+		self._validators = OrderedDict()
+		# (validator, key) by id of the schemas last passed
+		self._by_id = OrderedDict()
+		self._lock = threading.Lock()
+		self._hits = 0
+		self._misses = 0
+
+	def get(self, schema: dict):
+		"""Returns the validator of `schema`, compiling it if it is not cached.
+
+		Raises:
+			jsonschema.SchemaError:	`schema` is not valid against its meta-schema.
+
+		"""
+		entry = self._by_id.get(id(schema))
+		if entry is not None and entry[0].schema == schema:
+			validator, key = entry
+			with self._lock:
+				if key in self._validators:
+					self._validators.move_to_end(key)
+				self._hits += 1
+			return validator
+
+		key = self._schema_key(schema)
+		with self._lock:
+			validator = self._validators.get(key)
+			if validator is not None:
+				self._validators.move_to_end(key)
+				self._remember(schema, validator, key)
+				self._hits += 1
+				return validator
+			self._misses += 1
+
+		# The cached validator must not see later changes to the caller's schema
+		schema_object, schema = schema, copy.deepcopy(schema)
+		cls = jsonschema.validators.validator_for(schema)
+		cls.check_schema(schema)
+		validator = cls(schema)
+
+		with self._lock:
+			self._validators[key] = validator
+			if len(self._validators) > self.maxsize:
+				self._validators.popitem(last=False)
+			self._remember(schema_object, validator, key)
+
+		return validator
+
+	def _remember(self, schema: dict, validator, key: str):
+
+		self._by_id[id(schema)] = (validator, key)
+		self._by_id.move_to_end(id(schema))
+		if len(self._by_id) > self.maxsize:
+			self._by_id.popitem(last=False)
+
+	def info(self) -> CacheInfo:
+		"""Returns hit and miss counters and the current size. """
+
+		with self._lock:
+			return CacheInfo(self._hits, self._misses, self.maxsize, len(self._validators))
+
+	def clear(self):
+		"""Removes all validators and resets the counters. """
+
+		with self._lock:
+			self._validators.clear()
+			self._by_id.clear()
+			self._hits = 0
+			self._misses = 0
+
+	@staticmethod
+	def _schema_key(schema: dict) -> str:
+
+		canonical = json.dumps(schema, sort_keys=True, separators=(',', ':'), default=str)
+		return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+schema_validator_cache = SchemaValidatorCache()
+"""SchemaValidatorCache: Validator cache used by `assert_json()`. """
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_json_path(path: str) -> tuple:
+	"""Returns the fields of a dotted path or JSON pointer.
+
+	E.g. both `data.order.id` and `/data/order/id` are compiled into
+	`('data', 'order', 'id')`. Compiled paths are cached.
+
+	"""
+	if path.startswith('/'):
+		return tuple(field.replace('~1', '/').replace('~0', '~') for field in path[1:].split('/'))
+	return tuple(path.split('.'))
+
+
+def get_json_path(instance, path: Union[str, tuple]):
+	"""Returns the value at `path` of a JSON instance.
+
+	Args:
+		instance (dict or list):	JSON instance.
+		path (str or tuple):		Dotted path, JSON pointer or compiled path. Array items
+			are referenced by index. E.g. `items.0.id`.
+
+	Raises:
+		KeyError, IndexError, ValueError or TypeError:	The path does not exist.
+
+	"""
+	fields = compile_json_path(path) if isinstance(path, str) else path
+	for field in fields:
+		instance = instance[int(field)] if isinstance(instance, list) else instance[field]
+	return instance
 
 
 def assert_json(instance, expected_instance=None, expected_schema=None):
 	"""Validates a JSON instance against a expected JSON instance or schema.
 
-	If `expected_instance` is provided, a direct comparison is made.
+	If `expected_instance` is provided, a direct comparison is made. If it is a
+	`JsonMatcher`, the instance is matched against its partial document instead.
 
 	If `expected_schema` is provided, the function utilizes `jsonschema` to validate the
-	JSON instance against it.
+	JSON instance against it. Compiled validators are cached in `schema_validator_cache`.
 
 	Args:
 		instance (dict or list):	The JSON instance to be asserted.
 
-		expected_instance (dict or list, optional):	The expected JSON instance
-			for direct comparison.
+		expected_instance (dict, list or JsonMatcher, optional):	The expected JSON
+			instance for direct comparison, or a matcher.
 
 		expected_schema (dict, optional):	The JSON schema to validate the instance
 			against.
@@ -42,13 +181,94 @@ def assert_json(instance, expected_instance=None, expected_schema=None):
 	if expected_instance and expected_schema:
 		raise ValueError('Provide either `expected_instance` or `expected_schema`, not both')
 
-	if expected_instance:
+	if isinstance(expected_instance, JsonMatcher):
+		expected_instance.assert_match(instance)
+	elif expected_instance:
 		assert instance == expected_instance,	\
 			f'Expected JSON response body was `{expected_instance}` but got `{instance}`'
 	elif expected_schema:
-		try:
-			jsonschema.validate(instance, expected_schema)
-		except jsonschema.ValidationError as e:
-			raise AssertionError(f'JSON instance does not match the expected schema. {e}.') from e
+		validator = schema_validator_cache.get(expected_schema)
+		error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
+		if error is not None:
+			raise AssertionError(f'JSON instance does not match the expected schema. {error}.') from error
 	else:
 		raise ValueError('Provide expected_instance or expected_schema')
+
+
+def iter_json_array(chunks: Iterable[Union[bytes, str]]) -> Iterator:
+	"""Yields the items of a JSON array as its text arrives in `chunks`.
+
+	Only the current item and the unparsed text are kept in memory, so the memory used
+	does not depend on the number of items.
+
+	Args:
+		chunks (Iterable[bytes or str]):	Text of a JSON array, split in chunks of any
+			size. Bytes are decoded as UTF-8.
+
+	Yields:
+		Decoded array items.
+
+	Raises:
+		ValueError:	The text is not a JSON array.
+
+	"""
+	decoder = json.JSONDecoder()
+	utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+	chunks = iter(chunks)
+	buffer = ''
+	finished = False
+
+	def read(min_length: int) -> str:
+		nonlocal finished
+		text = buffer
+		while not finished and len(text) < min_length:
+			chunk = next(chunks, None)
+			if chunk is None:
+				finished = True
+				text += utf8_decoder.decode(b'', final=True)
+			else:
+				text += utf8_decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+		return text
+
+	def skip_whitespace(pos: int) -> int:
+		nonlocal buffer
+		while True:
+			while pos < len(buffer) and buffer[pos] in ' \t\n\r':
+				pos += 1
+			if pos < len(buffer) or finished:
+				return pos
+			buffer = read(1)[pos:]
+			pos = 0
+
+	pos = skip_whitespace(0)
+	if buffer[pos:pos + 1] != '[':
+		raise ValueError('Expected a JSON array')
+	pos = skip_whitespace(pos + 1)
+	if buffer[pos:pos + 1] == ']':
+		return
+
+	while True:
+		try:
+			item, end = decoder.raw_decode(buffer, pos)
+			# A value ending the buffer may be incomplete, e.g. a number
+			complete = end < len(buffer) or finished
+		except json.JSONDecodeError:
+			if finished:
+				raise
+			complete = False
+
+		if not complete:
+			# Grow the buffer geometrically so large items are not parsed many times
+			buffer = read(2 * (len(buffer) - pos) + 1)[pos:]
+			pos = 0
+			continue
+
+		yield item
+
+		pos = skip_whitespace(end)
+		separator = buffer[pos:pos + 1]
+		if separator == ']':
+			return
+		if separator != ',':
+			raise ValueError(f'Expected `,` or `]` but got `{separator}` in JSON array')
+		pos = skip_whitespace(pos + 1)
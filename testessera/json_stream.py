@@ -0,0 +1,298 @@
+"""Provides bulk validation of JSON record streams with a process pool.
+
+Records are read from JSONL or JSON array files, iterables or Kafka consumers, and
+validated in chunks by worker processes against a JSON schema or a `JsonMatcher`. Only
+a bounded number of chunks is in flight, so memory does not depend on the size of the
+input:
+
+	..sourcecode ::
+
+		report = assert_json_stream('exports/orders.jsonl.gz', ORDER_SCHEMA, workers=8)
+		print(report)
+
+"""
+from typing import Iterable, Iterator, Optional, Union
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+import multiprocessing
+import itertools
+import time
+import gzip
+import os
+import jsonschema
+from testessera.json import iter_json_array, schema_validator_cache
+from testessera.kafka_codecs import JSON, JsonCodec
+from testessera.matcher import JsonMatcher
+
+
+JsonStreamFailure = namedtuple('JsonStreamFailure', ('offset', 'error'))
+"""Record that failed validation.
+
+`offset` is the index of the record in the stream, or `(topic, partition, offset)` for
+Kafka messages.
+
+"""
+
+_READ_SIZE = 1024 * 1024
+
+
+class JsonStreamReport():
+	"""Results of `validate_json_stream()`.
+
+	Attributes:
+		records (int):				Validated records.
+		failed (int):				Records that failed validation.
+		failures (list[JsonStreamFailure]):	First failures, in stream order.
+		elapsed (float):			Seconds the validation took.
+
+	"""
+	def __init__(self):
+
+		self.records = 0
+		self.failed = 0
+		self.failures = []
+		self.elapsed = 0.0
+		# (chunk number, position in chunk, failure) of the first failures
+		self._ranked = []
+
+	def _add(self, number: int, result: tuple, max_failures: int):
+
+		records, failed, failures = result
+		self.records += records
+		self.failed += failed
+		if failures:
+			# Chunks complete out of order, keep the first failures of the stream
+			ranked = self._ranked + [(number, position, failure) for position, failure in enumerate(failures)]
+			self._ranked = sorted(ranked, key=lambda item: item[:2])[:max_failures]
+			self.failures = [failure for _, _, failure in self._ranked]
+
+	@property
+	def throughput(self) -> float:
+		"""Validated records per second. """
+
+		return self.records / self.elapsed if self.elapsed else 0.0
+
+	def __str__(self):
+		return (
+			f'JsonStreamReport(records={self.records}, failed={self.failed},'
+			f' throughput={self.throughput:.0f}/s)'
+		)
+
+
+def validate_json_stream(
+		source,
+		schema: Union[dict, JsonMatcher],
+		workers: Optional[int] = None,
+		chunk_size: int = 10_000,
+		max_failures: int = 10,
+		idle_timeout: float = 5.0,
+		json_codec: JsonCodec = JSON) -> JsonStreamReport:
+	# pylint: disable=too-many-arguments,too-many-locals
+	"""Validates every record of `source` and returns the aggregated results.
+
+	Args:
+		source:				One of:
+
+			- Path of a JSONL or JSON array file, gzipped if it ends in `.gz`.
+			- Binary or text file object with JSONL or a JSON array.
+			- Iterable of records: parsed JSON values, JSON texts, or Kafka messages.
+			- `KafkaConsumer`, consumed in batches until none arrives within
+				`idle_timeout`.
+
+		schema (dict or JsonMatcher):	JSON schema, or matcher of the records.
+		workers (int, optional):	Worker processes. Defaults to the number of CPUs.
+			With 0 or 1 records are validated in the calling process.
+		chunk_size (int):		Records sent to a worker at once.
+		max_failures (int):		Number of failures kept in the report.
+		idle_timeout (float):		See `source`.
+		json_codec (JsonCodec):		Parser of JSON texts, e.g.
+			`JsonCodec(backend='orjson')`.
+
+	Returns:
+		JsonStreamReport
+
+	Raises:
+		ValueError:	The file is neither JSONL nor a JSON array.
+
+	"""
+	if workers is None:
+		workers = os.cpu_count() or 1
+
+	report = JsonStreamReport()
+	start = time.perf_counter()
+	chunks = _iter_chunks(source, chunk_size, idle_timeout)
+
+	if workers <= 1:
+		_init_worker(schema, max_failures, json_codec)
+		for number, chunk in enumerate(chunks):
+			report._add(number, _validate_chunk(chunk), max_failures)	# pylint: disable=protected-access
+	else:
+		with ProcessPoolExecutor(
+				workers,
+				mp_context=multiprocessing.get_context('spawn'),
+				initializer=_init_worker,
+				initargs=(schema, max_failures, json_codec)) as executor:
+			# Bound the chunks in flight so memory does not grow with the input
+			in_flight = {}
+			for number, chunk in enumerate(chunks):
+				if len(in_flight) >= 2 * workers:
+					_collect(report, in_flight, max_failures, FIRST_COMPLETED)
+				in_flight[executor.submit(_validate_chunk, chunk)] = number
+			_collect(report, in_flight, max_failures, ALL_COMPLETED)
+
+	report.elapsed = time.perf_counter() - start
+	return report
+
+
+def assert_json_stream(
+		source,
+		schema: Union[dict, JsonMatcher],
+		workers: Optional[int] = None,
+		chunk_size: int = 10_000,
+		max_failures: int = 10,
+		idle_timeout: float = 5.0,
+		json_codec: JsonCodec = JSON) -> JsonStreamReport:
+	# pylint: disable=too-many-arguments
+	"""Asserts every record of `source` is valid. See `validate_json_stream()`.
+
+	Returns:
+		JsonStreamReport
+
+	Raises:
+		AssertionError:	Some record failed validation. The message lists the first
+			`max_failures` failures with their offsets.
+
+	"""
+	report = validate_json_stream(source, schema, workers, chunk_size, max_failures, idle_timeout, json_codec)
+	assert not report.failed,	\
+		(
+			f'{report.failed} of {report.records} JSON records are not valid. First failures: '
+			+ '; '.join(f'[{failure.offset}] {failure.error}' for failure in report.failures)
+		)
+	return report
+
+
+def _collect(report: JsonStreamReport, in_flight: dict, max_failures: int, return_when: str):
+
+	done, _ = wait(in_flight, return_when=return_when)
+	for future in done:
+		report._add(in_flight.pop(future), future.result(), max_failures)	# pylint: disable=protected-access
+
+
+_worker_check = None
+_worker_max_failures = 0
+_worker_json_codec = JSON
+
+
+def _init_worker(schema: Union[dict, JsonMatcher], max_failures: int, json_codec: JsonCodec):
+	# pylint: disable=global-statement
+
+	global _worker_check, _worker_max_failures, _worker_json_codec
+	_worker_max_failures = max_failures
+	_worker_json_codec = json_codec
+	if isinstance(schema, JsonMatcher):
+		def check_match(instance) -> Optional[str]:
+			failures = schema.match(instance)
+			return failures[0] if failures else None
+
+		_worker_check = check_match
+		return
+
+	validator = schema_validator_cache.get(schema)
+
+	def check(instance) -> Optional[str]:
+		if validator.is_valid(instance):
+			return None
+		error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
+		path = '.'.join(str(field) for field in error.absolute_path) or '$'
+		return f'`{path}` {error.message}'
+
+	_worker_check = check
+
+
+def _validate_chunk(chunk: list) -> tuple:
+
+	failed = 0
+	failures = []
+	for offset, record in chunk:
+		if isinstance(record, (bytes, str)):
+			try:
+				record = _worker_json_codec.decode(record)
+			except ValueError as e:
+				error = f'Invalid JSON: {e}'
+			else:
+				error = _worker_check(record)
+		else:
+			error = _worker_check(record)
+		if error is not None:
+			failed += 1
+			if len(failures) < _worker_max_failures:
+				failures.append(JsonStreamFailure(offset, error))
+	return len(chunk), failed, failures
+
+
+def _iter_chunks(source, chunk_size: int, idle_timeout: float) -> Iterator[list]:
+
+	records = _iter_records(source, chunk_size, idle_timeout)
+	while True:
+		chunk = list(itertools.islice(records, chunk_size))
+		if not chunk:
+			return
+		yield chunk
+
+
+def _iter_records(source, chunk_size: int, idle_timeout: float) -> Iterator[tuple]:
+
+	if isinstance(source, (str, os.PathLike)):
+		opener = gzip.open if os.fspath(source).endswith('.gz') else open
+		with opener(source, 'rb') as file:
+			yield from _iter_file_records(file)
+	elif hasattr(source, 'read'):
+		yield from _iter_file_records(source)
+	elif hasattr(source, 'consume_many'):
+		while True:
+			batch = source.consume_many(chunk_size, timeout=idle_timeout)
+			if not batch:
+				return
+			yield from _iter_item_records(batch, 0)
+	else:
+		yield from _iter_item_records(source, 0)
+
+
+def _iter_item_records(items: Iterable, start: int) -> Iterator[tuple]:
+
+	for index, item in enumerate(items, start):
+		value = getattr(item, 'value', None)
+		if callable(value):
+			# Kafka message, decoded here if a `KafkaMessage` has another codec than JSON
+			codec = getattr(item, 'codec', None)
+			record = item.decoded if codec is not None and codec.name != 'json' else value()
+			yield (item.topic(), item.partition(), item.offset()), record
+		else:
+			yield index, item
+
+
+def _iter_file_records(file) -> Iterator[tuple]:
+
+	first = file.read(_READ_SIZE)
+	blocks = itertools.chain([first], iter(lambda: file.read(_READ_SIZE), first[:0]))
+	stripped = first.lstrip()
+	if stripped[:1] in ('[', b'['):
+		yield from enumerate(iter_json_array(blocks))
+	elif stripped[:1] in ('{', b'{') or not stripped:
+		yield from enumerate(_iter_lines(blocks))
+	else:
+		raise ValueError('Expected JSONL or a JSON array')
+
+
+def _iter_lines(blocks: Iterable) -> Iterator:
+	"""Yields the non-blank lines of text split in `blocks`. """
+
+	rest = None
+	for block in blocks:
+		lines = (block if rest is None else rest + block).split(b'\n' if isinstance(block, bytes) else '\n')
+		# The last line may continue in the next block
+		rest = lines.pop()
+		yield from (line for line in lines if line.strip())
+	if rest and rest.strip():
+		yield rest
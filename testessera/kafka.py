@@ -1,16 +1,452 @@
-from typing import Optional, Union
+from typing import Callable, Iterable, Optional, Union
 from collections import deque
+from datetime import datetime
+import itertools
+import threading
+import bisect
+import math
 import logging
 import time
 import uuid
-import json
 from confluent_kafka import (
 	Consumer,
 	Producer,
 	Message,
-	KafkaError
+	KafkaError,
+	KafkaException,
+	TopicPartition
 )
-from testessera import assert_json
+from testessera.json import assert_json, compile_json_path, get_json_path
+from testessera.histogram import LatencyHistogram
+from testessera.kafka_codecs import JSON, Codec, CodecRegistry
+from testessera.kafka_memory import MemoryConsumer, MemoryProducer, is_memory_config
+
+
+DROP_OLDEST = 'drop_oldest'
+"""str: `TopicQueue` policy that drops the oldest messages to make room. """
+
+DROP_NEWEST = 'drop_newest'
+"""str: `TopicQueue` policy that drops the messages that do not fit. """
+
+BLOCK = 'block'
+"""str: `TopicQueue` policy that blocks the consumer until there is room. """
+
+
+class TopicQueue():
+	"""Bounded queue of Kafka messages for the topic-to-queue mapping of `KafkaConsumer`.
+
+	It replaces the `deque` of a mapping entry, with the same usage: the consumer adds
+	messages with `appendleft()` and they are taken in arrival order with `pop()`. Both
+	the number of messages and their total size (key and value bytes) are bounded.
+
+	Attributes:
+		max_messages (int):		Maximum number of messages.
+		max_bytes (int):		Maximum total size of the messages.
+		policy (str):			`DROP_OLDEST`, `DROP_NEWEST` or `BLOCK`.
+		block_timeout (float):		Maximum seconds `BLOCK` waits for room. The
+			consumer polls on the thread that blocks, so if nothing takes messages
+			from another thread the message is dropped once it expires.
+		dropped (int):			Number of dropped messages.
+		high_water_messages (int):	Maximum number of messages queued at once.
+		high_water_bytes (int):		Maximum size of the messages queued at once.
+
+	Example:
+
+		..sourcecode ::
+
+			orders_queue = TopicQueue(max_messages=10_000, max_bytes=64 * 1024 * 1024)
+			consumer = KafkaConsumer(topics={'orders': orders_queue})
+			...
+			assert orders_queue.dropped == 0, orders_queue
+
+	"""
+	def __init__(self,
+			max_messages: int = 10_000,
+			max_bytes: int = 64 * 1024 * 1024,
+			policy: str = DROP_OLDEST,
+			block_timeout: float = 1.0):
+
+		if policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+			raise ValueError(f'Unknown policy `{policy}`')
+
+		self.max_messages = max_messages
+		self.max_bytes = max_bytes
+		self.policy = policy
+		self.block_timeout = block_timeout
+		self.dropped = 0
+		self.high_water_messages = 0
+		self.high_water_bytes = 0
+		self._messages = deque()
+		self._bytes = 0
+		self._condition = threading.Condition()
+
+	@property
+	def bytes(self) -> int:
+		"""Total size of the queued messages. """
+
+		return self._bytes
+
+	def appendleft(self, msg: Message):
+		"""Adds a message, dropping messages or blocking according to `policy`. """
+
+		size = _message_size(msg)
+		with self._condition:
+			if self.policy == BLOCK:
+				fits = self._condition.wait_for(lambda: not self._messages or self._fits(size), self.block_timeout)
+				if not fits:
+					self.dropped += 1
+					return
+			elif self.policy == DROP_NEWEST:
+				if not self._fits(size):
+					self.dropped += 1
+					return
+			else:
+				while self._messages and not self._fits(size):
+					self._bytes -= _message_size(self._messages.pop())
+					self.dropped += 1
+
+			self._messages.appendleft(msg)
+			self._bytes += size
+			self.high_water_messages = max(self.high_water_messages, len(self._messages))
+			self.high_water_bytes = max(self.high_water_bytes, self._bytes)
+
+	def pop(self) -> Message:
+		"""Removes and returns the oldest message.
+
+		Raises:
+			IndexError:	The queue is empty.
+
+		"""
+		with self._condition:
+			msg = self._messages.pop()
+			self._bytes -= _message_size(msg)
+			self._condition.notify_all()
+		return msg
+
+	def popleft(self) -> Message:
+		"""Removes and returns the newest message.
+
+		Raises:
+			IndexError:	The queue is empty.
+
+		"""
+		with self._condition:
+			msg = self._messages.popleft()
+			self._bytes -= _message_size(msg)
+			self._condition.notify_all()
+		return msg
+
+	def clear(self):
+		"""Removes all the messages. Counters are kept. """
+
+		with self._condition:
+			self._messages.clear()
+			self._bytes = 0
+			self._condition.notify_all()
+
+	def __len__(self):
+
+		return len(self._messages)
+
+	def __iter__(self):
+
+		with self._condition:
+			return iter(list(self._messages))
+
+	def __getitem__(self, index: int) -> Message:
+
+		return self._messages[index]
+
+	def _fits(self, size: int) -> bool:
+
+		return len(self._messages) < self.max_messages and self._bytes + size <= self.max_bytes
+
+	def __str__(self):
+		return (
+			f'TopicQueue({len(self._messages)} messages, {self._bytes} bytes, dropped={self.dropped},'
+			f' high_water_messages={self.high_water_messages}, high_water_bytes={self.high_water_bytes})'
+		)
+
+
+def _message_size(msg: Message) -> int:
+
+	return len(msg.value() or b'') + len(msg.key() or b'')
+
+
+PROBE_PRODUCER_HEADER = 'testessera-producer'
+"""str: Header with the id of the `KafkaProducer` that stamped the message. """
+
+PROBE_SEQUENCE_HEADER = 'testessera-seq'
+"""str: Header with the per producer and topic sequence number of the message. """
+
+PROBE_SENT_HEADER = 'testessera-sent-ns'
+"""str: Header with the send time of the message, in nanoseconds since the epoch. """
+
+
+def _add_sequence(ranges: list, sequence: int) -> bool:
+	"""Adds `sequence` to sorted and disjoint `[first, last]` ranges, merging them.
+	Returns False if it was already in a range.
+
+	"""
+	index = bisect.bisect_right(ranges, [sequence, math.inf])
+	previous = ranges[index - 1] if index else None
+	following = ranges[index] if index < len(ranges) else None
+	if previous is not None and previous[1] >= sequence:
+		return False
+
+	joins_previous = previous is not None and previous[1] == sequence - 1
+	joins_following = following is not None and following[0] == sequence + 1
+	if joins_previous and joins_following:
+		previous[1] = following[1]
+		del ranges[index]
+	elif joins_previous:
+		previous[1] = sequence
+	elif joins_following:
+		following[0] = sequence
+	else:
+		ranges.insert(index, [sequence, sequence])
+	return True
+
+
+class LatencyProbe():
+	"""Measures end-to-end latency of messages stamped by a `KafkaProducer` with
+	`latency_probe=True`.
+
+	Latency is the time between the producer stamp and the observation, so producer and
+	consumer clocks must be synchronized if they run on different hosts. The sequence
+	numbers seen are kept per producer and topic as ranges, so messages of several
+	partitions may arrive in any order. Messages without probe headers are ignored.
+
+	Attributes:
+		latency (LatencyHistogram):	End-to-end latencies.
+		duplicates (int):		Messages whose sequence number was already seen.
+
+	Example:
+
+		..sourcecode ::
+
+			probe = LatencyProbe()
+			consumer = KafkaConsumer(topics=['orders-enriched'], latency_probe=probe)
+			producer = KafkaProducer(latency_probe=True)
+
+			producer.produce_many('orders', orders)
+			consumer.consume_many(len(orders), timeout=30.0)
+
+			probe.assert_latency(percentile=99, max_seconds=0.5)
+			assert probe.gaps == 0, probe
+
+	"""
+	def __init__(self):
+
+		self.latency = LatencyHistogram()
+		self.duplicates = 0
+		# Sorted and disjoint [first, last] ranges of the sequence numbers seen
+		self._sequences = {}
+		self._lock = threading.Lock()
+
+	def observe(self, msg: Message):
+		"""Records the latency and sequence number of `msg`. """
+
+		now = time.time_ns()
+		headers = dict(msg.headers() or ())
+		sent = headers.get(PROBE_SENT_HEADER)
+		if sent is None:
+			return
+
+		self.latency.record_us((now - int(sent)) // 1000)
+
+		producer = headers.get(PROBE_PRODUCER_HEADER)
+		sequence = headers.get(PROBE_SEQUENCE_HEADER)
+		if producer is None or sequence is None:
+			return
+		sequence = int(sequence)
+		with self._lock:
+			ranges = self._sequences.setdefault((producer, msg.topic()), [])
+			if not _add_sequence(ranges, sequence):
+				self.duplicates += 1
+
+	@property
+	def gaps(self) -> int:
+		"""Sequence numbers still missing between the first and last seen of each
+		producer and topic. Late messages stop counting once they arrive.
+
+		"""
+		with self._lock:
+			return sum(
+				following[0] - previous[1] - 1
+				for ranges in self._sequences.values()
+				for previous, following in zip(ranges, ranges[1:])
+			)
+
+	def summary(self) -> dict:
+		"""Returns the latency summary and the gap and duplicate counters. """
+
+		return {**self.latency.summary(), 'gaps': self.gaps, 'duplicates': self.duplicates}
+
+	def assert_latency(self, percentile: float = 99, max_seconds: float = 1.0):
+		"""Asserts the latency at `percentile` is within `max_seconds`.
+
+		Raises:
+			AssertionError:	The latency budget is exceeded or no message was observed.
+
+		"""
+		assert self.latency.count, 'No stamped Kafka message observed'
+		actual = self.latency.percentile(percentile)
+		assert actual <= max_seconds,	\
+			f'Expected p{percentile} latency within {max_seconds}s but got {actual}s. {self}'
+
+	def __str__(self):
+		return f'LatencyProbe(gaps={self.gaps}, duplicates={self.duplicates}, latency={self.latency})'
+
+
+class KafkaMessage():
+	"""Kafka message whose value is decoded once, on first access.
+
+	Methods of the wrapped `confluent_kafka.Message`, such as `value()`, `key()` or
+	`headers()`, are available. Values are decoded as JSON unless another `Codec` is
+	given. Consumers with a `CodecRegistry` return their messages already wrapped.
+
+	Example:
+
+		..sourcecode ::
+
+			msgs = [KafkaMessage(msg) for msg in consumer.consume_many(1000)]
+			created = [msg for msg in msgs if msg.json['event_type'] == 'OrderCreated']
+
+			assert_kafka_message(created[0], **{'data.order.id': order_id})
+
+	"""
+	__slots__ = ('message', 'codec', '_decoded')
+
+	_UNDECODED = object()
+
+	def __init__(self, message: Message, codec: Codec = JSON):
+
+		self.message = message
+		self.codec = codec
+		self._decoded = KafkaMessage._UNDECODED
+
+	@property
+	def decoded(self):
+		"""Value decoded with `codec`.
+
+		Raises:
+			ValueError:	The value could not be decoded. `JSONDecodeError` with the
+				JSON codec.
+
+		"""
+		if self._decoded is KafkaMessage._UNDECODED:
+			self._decoded = self.codec.decode(self.message.value())
+		return self._decoded
+
+	@property
+	def json(self):
+		"""Same as `decoded`, named after the default codec. """
+
+		return self.decoded
+
+	def __getattr__(self, name):
+
+		return getattr(self.message, name)
+
+	def __bool__(self):
+
+		return True
+
+	def __str__(self):
+		return f'KafkaMessage({self.message.topic()}, {self.message.partition()}, {self.message.offset()})'
+
+
+class _MessageIndex():
+	"""Messages indexed by key and by selected headers.
+
+	Messages are numbered in arrival order. Only the last `max_messages` are kept.
+
+	"""
+	def __init__(self, header_names: Iterable[str], max_messages: int):
+
+		self.condition = threading.Condition()
+		self._header_names = frozenset(header_names)
+		self._max_messages = max_messages
+		self._messages = []
+		self._base = 0
+		self._by_key = {}
+		self._by_header = {}
+
+	def add(self, msg: Message):
+
+		with self.condition:
+			self._index(self._base + len(self._messages), msg)
+			self._messages.append(msg)
+			if len(self._messages) > self._max_messages:
+				self._prune()
+			self.condition.notify_all()
+
+	@property
+	def end(self) -> int:
+		"""Number of the next message to arrive. Must be called with `condition` acquired. """
+
+		return self._base + len(self._messages)
+
+	def find(self, key=None, header=None, predicate=None, start: int = 0) -> tuple:
+		"""Returns the first message numbered `start` or later matching all the criteria,
+		and the number of the first message not examined.
+
+		Must be called with `condition` acquired.
+
+		"""
+		start = max(start, self._base)
+		end = self.end
+		if key is not None:
+			candidates = self._by_key.get(_to_bytes(key), ())
+		elif header is not None and header[0] in self._header_names:
+			candidates = self._by_header.get((header[0], _to_bytes(header[1])), ())
+		else:
+			candidates = range(start, end)
+
+		for number in candidates:
+			if number < start:
+				continue
+			msg = self._messages[number - self._base]
+			if header is not None and not _has_header(msg, header):
+				continue
+			if predicate is not None and not predicate(msg):
+				continue
+			return msg, number + 1
+
+		return None, end
+
+	def _index(self, number: int, msg: Message):
+
+		key = msg.key()
+		if key is not None:
+			self._by_key.setdefault(key, []).append(number)
+		if self._header_names:
+			for name, value in msg.headers() or ():
+				if name in self._header_names:
+					self._by_header.setdefault((name, value), []).append(number)
+
+	def _prune(self):
+
+		# Drop the oldest half so that pruning is amortized
+		dropped = len(self._messages) // 2
+		self._base += dropped
+		self._messages = self._messages[dropped:]
+		self._by_key = {}
+		self._by_header = {}
+		for number, msg in enumerate(self._messages, self._base):
+			self._index(number, msg)
+
+
+def _to_bytes(value) -> bytes:
+
+	return value.encode() if isinstance(value, str) else value
+
+
+def _has_header(msg: Message, header: tuple) -> bool:
+
+	name, value = header[0], _to_bytes(header[1])
+	return any(name == header_name and value == header_value for header_name, header_value in msg.headers() or ())
 
 
 class KafkaConsumer():
@@ -25,12 +461,19 @@ class KafkaConsumer():
 		_topic_queue_mapping (Optional[dict]): Mapping of topic names to queues for
 			consuming and processing messages, if provided.
 
+		assignment_time (Optional[float]):	Seconds the last `subscribe()` took until
+			all the assigned partitions were positioned.
+
 	"""
 	def __init__(self,
 	      		topics: Optional[Union[list[str], dict[str, deque]]],
 			bootstrap_servers=None,
 			group_id=None,
-			config=None):
+			config=None,
+			assignment_timeout: float = 30.0,
+			latency_probe: Optional[LatencyProbe] = None,
+			codecs: Optional[CodecRegistry] = None):
+		# pylint: disable=too-many-arguments
 		"""
 
 		Args:
@@ -38,14 +481,26 @@ class KafkaConsumer():
 				names to subscribe to, or mapping of topic names to queues for
 				consumption. If a mapping of topic names to queues is provided,
 				the consumer's received messages are added to their respective queues
-				for separate processing.
+				for separate processing. Use `TopicQueue` instead of `deque` to bound
+				the memory used by the queues.
 
-			bootstrap_servers (str, optional):
+			bootstrap_servers (str, optional):	Defaults to `localhost:9093`. Use
+				`memory://` to run against the in-process broker of `kafka_memory`.
 
 			group_id (str, optional):
 
 			config (dict, optional):
 
+			assignment_timeout (float, optional):	Maximum seconds to wait for partition
+				assignment when subscribing to `topics`.
+
+			latency_probe (LatencyProbe, optional):	Probe that observes every consumed
+				message.
+
+			codecs (CodecRegistry, optional):	If provided, messages are returned
+				wrapped in `KafkaMessage` with the codec of their topic, and decoded
+				on first access.
+
 		Example:
 			Initializing with a topic list:
 
@@ -77,25 +532,47 @@ class KafkaConsumer():
 				"enable.partition.eof": True
 			}
 
-		self.consumer = Consumer(**config)
+		self.consumer = MemoryConsumer(**config) if is_memory_config(config) else Consumer(**config)
 
 		self._topic_queue_mapping = None
+		self._pending = deque()
+		self.assignment_time = None
+		self.latency_probe = latency_probe
+		self.codecs = codecs
+		self._index = None
+		self._indexing_thread = None
+		self._indexing_stop = threading.Event()
+		self._indexing_error = None
 		if topics:
-			self.subscribe(topics)
+			self.subscribe(topics, assignment_timeout)
 
 
-	def subscribe(self, topics: Union[list[str], dict[str, deque]]):
+	def subscribe(self, topics: Union[list[str], dict[str, deque]], timeout: float = 30.0) -> float:
 		"""Subscribes to `topics` and waits for partition assignment.
 
+		Assigned partitions are positioned at their high watermark from the `on_assign`
+		callback, so only messages produced after the subscription are consumed. That
+		position is committed, and so is the position of revoked partitions, so on a
+		rebalance partitions resume from their committed offset instead and no message is
+		skipped. The method returns as soon as all the assigned partitions are positioned.
+
 		Args:
 			topics:	List of topic names to subscribe to, or mapping of topic names to
 				queues for consumption. If a mapping of topic names to queues is
 				provided, the consumer's received messages are added to their
 				respective queues for separate processing.
 
+			timeout:	Maximum seconds to wait for partition assignment.
+
+		Returns:
+			float:	Seconds until the partitions were assigned and positioned. Also stored
+				in `assignment_time`.
+
 		Raises:
 			KafkaException
 
+			TimeoutError	Partitions were not assigned within `timeout`.
+
 		Raises:
 			RuntimeError	If called on a closed consumer.
 
@@ -108,21 +585,47 @@ class KafkaConsumer():
 			# `topics` is already a list
 			...
 
-		self.consumer.subscribe(topics)
-		self._wait_for_partition_assignment()
-
+		assigned = []
+
+		def on_assign(consumer: Consumer, partitions: list):
+			callback_timeout = max(deadline - time.monotonic(), 1.0)
+			positioned = []
+			for partition, committed in zip(partitions, consumer.committed(partitions, timeout=callback_timeout)):
+				if committed.offset >= 0:
+					# Another member owned the partition, resume where it stopped
+					partition.offset = committed.offset
+				else:
+					_, partition.offset = consumer.get_watermark_offsets(partition, timeout=callback_timeout)
+					positioned.append(partition)
+			if positioned:
+				# So that a later owner of the partitions does not skip messages
+				consumer.commit(offsets=positioned, asynchronous=False)
+			consumer.assign(partitions)
+			assigned.append(partitions)
+
+		def on_revoke(consumer: Consumer, partitions: list):
+			positions = [p for p in consumer.position(partitions) if p.offset >= 0]
+			if positions:
+				consumer.commit(offsets=positions, asynchronous=False)
+
+		start = time.monotonic()
+		deadline = start + timeout
+		self.consumer.subscribe(topics, on_assign=on_assign, on_revoke=on_revoke)
+
+		while not assigned:
+			remaining = deadline - time.monotonic()
+			if remaining <= 0:
+				raise TimeoutError(f'Partitions of {topics} not assigned within {timeout} seconds')
+			msg = self.consumer.poll(min(remaining, 0.1))
+			msg = self._accept(msg) if msg else None
+			if msg:
+				# Keep messages polled while waiting so that they are not lost
+				self._pending.append(msg)
 
-	def _wait_for_partition_assignment(self):
-		# Consider using the on_assign callback provided by confluent_kafka to know when partitions have been assigned
+		self.assignment_time = time.monotonic() - start
+		logging.debug('Consumer assignment %s in %.3f seconds', assigned[-1], self.assignment_time)
 
-		while True:
-			logging.debug('Polling until _PARTITION_EOF')
-			msg = self.consumer.poll(0.2)
-			if msg:
-				error = msg.error()
-				if error and error.code() == KafkaError._PARTITION_EOF:	# pylint: disable=protected-access
-					logging.warning('\nConsumer assignement: %s', self.consumer.assignment())
-					break
+		return self.assignment_time
 
 
 	def consume_one(self, timeout: float = 60.0) -> Optional[Message]:
@@ -140,15 +643,21 @@ class KafkaConsumer():
 			Optional[Message]: The consumed Kafka message if available, or None if no message
 				was received within the timeout.
 
+		Raises:
+			KafkaException:	The consumer reported an error other than partition EOF.
+			RuntimeError:	Messages are being indexed, see `start_indexing()`.
+
 		"""
-		start = time.time()
-		while (time.time() - start) < timeout:
-			msg = self._poll_iteration()
+		self._check_not_indexing()
+		deadline = time.monotonic() + timeout
+		while True:
+			remaining = deadline - time.monotonic()
+			if remaining <= 0:
+				return None
+			msg = self._poll_iteration(min(remaining, 1.0))
 			if msg:
 				return msg
 
-		return None
-
 
 	def consume_many(self, num_messages: int, timeout: float = 2.0) -> deque[Message]:
 		"""Consume and process multiple Kafka messages.
@@ -157,6 +666,9 @@ class KafkaConsumer():
 		the timeout, they are returned in a deque. If fewer messages are available before the
 		timeout expires, the method returns all available messages.
 
+		Messages are fetched in batches with `Consumer.consume()`, and the method returns
+		no later than `timeout`.
+
 		If the `_topic_queue_mapping` attribute is provided during initialization,
 		the consumed messages will be added to their respective topic-specific queues
 		in the `_topic_queue_mapping`. This is useful for scenarios where messages need
@@ -169,60 +681,539 @@ class KafkaConsumer():
 				Defaults to 2.0 seconds.
 
 		Returns:
-			deque[Message]: A deque containing the consumed Kafka messages. The deque may
-				contain fewer messages if the timeout expires before the requested number
-				of messages are received.
+			deque[Message]: A deque containing the consumed Kafka messages in arrival order.
+				The deque may contain fewer messages if the timeout expires before the
+				requested number of messages are received.
+
+		Raises:
+			KafkaException:	The consumer reported an error other than partition EOF.
+			RuntimeError:	Messages are being indexed, see `start_indexing()`.
+
 		"""
+		self._check_not_indexing()
 		msgs = deque()
+		while self._pending and len(msgs) < num_messages:
+			msgs.append(self._pending.popleft())
 
-		start = time.time()
-		while ((time.time() - start) < timeout) and (len(msgs) < num_messages):
-			msg = self._poll_iteration()
-			if msg:
-				msgs.appendleft(msg)
+		deadline = time.monotonic() + timeout
+		while len(msgs) < num_messages:
+			remaining = deadline - time.monotonic()
+			if remaining <= 0:
+				break
+			batch = self.consumer.consume(num_messages - len(msgs), remaining)
+			msgs.extend(msg for msg in map(self._accept, batch) if msg is not None)
 
 		return msgs
 
 
-	def _poll_iteration(self) -> Optional[Message]:
+	def seek_to_time(self, when: Union[datetime, float], topic: Optional[str] = None, timeout: float = 10.0) -> dict:
+		"""Positions the assigned partitions at the first message published at or after `when`.
 
-		msg = self.consumer.poll(1.0)
-		if msg:
-			error = msg.error()
-			if not error:
-				if self._topic_queue_mapping:
-					topic = msg.topic()
-					if topic:
-						self._topic_queue_mapping[topic].appendleft(msg)
-				return msg
-		return None
+		Offsets are looked up with `offsets_for_times()`, so no message is read. Partitions
+		without such messages are positioned at their high watermark.
+
+		Args:
+			when (datetime or float):	Time, or epoch seconds.
+			topic (str, optional):		Only position the partitions of this topic.
+			timeout (float):		Maximum seconds to wait for the offset lookup.
+
+		Returns:
+			dict:	Offsets by `(topic, partition)`.
+
+		Raises:
+			KafkaException
+
+		"""
+		offsets = self._offsets_for_time(self._assigned_partitions(topic), when, timeout)
+		self._seek(offsets)
+		return offsets
+
+
+	def seek_to_offset(self, offset: int, topic: Optional[str] = None, partition: Optional[int] = None):
+		"""Positions the assigned partitions at `offset`.
+
+		Args:
+			offset (int):			Offset of the next message consumed.
+			topic (str, optional):		Only position the partitions of this topic.
+			partition (int, optional):	Only position this partition.
+
+		Raises:
+			KafkaException
+
+		"""
+		self._seek({
+			(p.topic, p.partition): offset
+			for p in self._assigned_partitions(topic) if partition is None or p.partition == partition
+		})
+
+
+	def consume_range(self,
+			start: Union[int, datetime],
+			end: Optional[Union[int, datetime]] = None,
+			topic: Optional[str] = None,
+			timeout: float = 60.0) -> deque[Message]:
+		"""Consumes the messages between `start` and `end` of every assigned partition.
+
+		Only the requested slice is read: partitions are positioned at their start offset,
+		and each of them is done once its end offset is reached. Afterwards partitions
+		are positioned at their end offset. The other assigned partitions are paused
+		meanwhile, so their messages are left for later calls.
+
+		Args:
+			start (int or datetime):	First offset, or time of the first message.
+			end (int or datetime, optional):	Offset, or time, where the range ends,
+				exclusive. Defaults to the high watermarks at the time of the call.
+			topic (str, optional):		Only consume the partitions of this topic.
+			timeout (float):		Maximum seconds to wait for the messages.
+
+		Returns:
+			deque[Message]:	Messages in arrival order. Fewer messages than in the range
+				are returned if `timeout` expires.
+
+		Raises:
+			KafkaException
+			RuntimeError:	Messages are being indexed, see `start_indexing()`.
+
+		Example:
+
+			..sourcecode ::
+
+				msgs = consumer.consume_range(datetime(2024, 5, 1), datetime(2024, 5, 2), topic='orders')
+				assert all(KafkaMessage(msg).json['version'] == 2 for msg in msgs)
+
+		"""
+		self._check_not_indexing()
+		deadline = time.monotonic() + timeout
+		partitions = self._assigned_partitions(topic)
+		ends = self._range_offsets(partitions, end, timeout)
+		starts = self._range_offsets(partitions, start, timeout)
+		remaining = {key for key, start_offset in starts.items() if start_offset < ends[key]}
+		self._seek(starts)
+
+		paused = [p for p in self.consumer.assignment() if (p.topic, p.partition) not in remaining]
+		if paused:
+			self.consumer.pause(paused)
+		# Messages of partitions outside the range fetched before pausing, read again later
+		rewinds = {}
+		msgs = deque()
+		try:
+			while remaining:
+				wait = deadline - time.monotonic()
+				if wait <= 0:
+					break
+				for msg in self.consumer.consume(1000, min(wait, 1.0)):
+					if msg.error():
+						self._accept(msg)
+						continue
+					key = (msg.topic(), msg.partition())
+					if key not in ends:
+						rewinds.setdefault(key, msg.offset())
+						continue
+					if key not in remaining or msg.offset() >= ends[key]:
+						continue
+					msgs.append(self._accept(msg))
+					if msg.offset() >= ends[key] - 1:
+						remaining.discard(key)
+		finally:
+			if paused:
+				self.consumer.resume(paused)
+
+		self._seek({**rewinds, **ends})
+		return msgs
+
+
+	def _assigned_partitions(self, topic: Optional[str] = None) -> list:
+
+		return [p for p in self.consumer.assignment() if topic is None or p.topic == topic]
+
+
+	def _offsets_for_time(self, partitions: list, when: Union[datetime, float], timeout: float) -> dict:
+
+		timestamp = when.timestamp() if isinstance(when, datetime) else when
+		found = self.consumer.offsets_for_times(
+			[TopicPartition(p.topic, p.partition, int(timestamp * 1000)) for p in partitions], timeout=timeout
+		)
+		offsets = {}
+		for partition in found:
+			if partition.error:
+				raise KafkaException(partition.error)
+			if partition.offset < 0:
+				_, partition.offset = self.consumer.get_watermark_offsets(partition, timeout=timeout)
+			offsets[(partition.topic, partition.partition)] = partition.offset
+		return offsets
+
+
+	def _range_offsets(self, partitions: list, bound: Optional[Union[int, datetime]], timeout: float) -> dict:
+
+		if isinstance(bound, datetime):
+			return self._offsets_for_time(partitions, bound, timeout)
+		offsets = {}
+		for partition in partitions:
+			if bound is None:
+				_, offset = self.consumer.get_watermark_offsets(partition, timeout=timeout)
+			else:
+				offset = bound
+			offsets[(partition.topic, partition.partition)] = offset
+		return offsets
+
+
+	def _seek(self, offsets: dict):
+
+		# Messages of these partitions polled before seeking are stale
+		self._pending = deque(msg for msg in self._pending if (msg.topic(), msg.partition()) not in offsets)
+		for (topic, partition), offset in offsets.items():
+			self.consumer.seek(TopicPartition(topic, partition, offset))
+
+
+	def _poll_iteration(self, timeout: float = 1.0) -> Optional[Message]:
+
+		if self._pending:
+			return self._pending.popleft()
+
+		msg = self.consumer.poll(timeout)
+		return self._accept(msg) if msg else None
+
+
+	def _accept(self, msg: Message) -> Optional[Message]:
+		"""Returns `msg`, wrapped in `KafkaMessage` if there are codecs, or None if it is a
+		partition EOF event.
+
+		Raises:
+			KafkaException:	`msg` carries an error other than partition EOF.
+
+		"""
+		error = msg.error()
+		if error:
+			if error.code() == KafkaError._PARTITION_EOF:	# pylint: disable=protected-access
+				return None
+			raise KafkaException(error)
+
+		if self.codecs is not None:
+			msg = KafkaMessage(msg, self.codecs.codec_for(msg.topic()))
+
+		if self.latency_probe is not None:
+			self.latency_probe.observe(msg)
+
+		if self._topic_queue_mapping:
+			topic = msg.topic()
+			if topic:
+				self._topic_queue_mapping[topic].appendleft(msg)
+		return msg
+
+
+	def start_indexing(self, header_names: Iterable[str] = (), max_messages: int = 100_000):
+		"""Starts a background thread that consumes and indexes messages for `await_message()`.
+
+		Messages are indexed by key and by the values of `header_names`. Once started,
+		`consume_one()`, `consume_many()` and `consume_range()` raise `RuntimeError`,
+		as they would take messages away from the index.
+
+		Args:
+			header_names (Iterable[str]):	Names of the headers to index.
+			max_messages (int):		Maximum number of messages kept.
+
+		Raises:
+			RuntimeError:	Indexing was already started.
+
+		"""
+		if self._indexing_thread is not None:
+			raise RuntimeError('Message indexing already started')
+
+		self._index = _MessageIndex(header_names, max_messages)
+		self._indexing_thread = threading.Thread(target=self._index_messages, daemon=True)
+		self._indexing_thread.start()
+
+
+	def _check_not_indexing(self):
+
+		if self._indexing_thread is not None and self._indexing_thread.is_alive():
+			raise RuntimeError('Messages are being indexed, use await_message() instead')
+
+
+	def await_message(self,
+			key: Optional[Union[str, bytes]] = None,
+			header: Optional[tuple] = None,
+			predicate: Optional[Callable[[Message], bool]] = None,
+			timeout: float = 60.0) -> Optional[Message]:
+		"""Waits for the first message, since indexing started, matching all the criteria.
+
+		Lookups by key and by indexed headers are O(1). Many threads can wait on the same
+		consumer concurrently. Indexing is started with default arguments if needed.
+
+		Args:
+			key (str or bytes, optional):	Message key.
+			header (tuple, optional):	`(name, value)` header.
+			predicate (Callable, optional):	Returns True for the expected message.
+			timeout (float):		Maximum seconds to wait.
+
+		Returns:
+			Optional[Message]:	The message, or None if it did not arrive in time.
+
+		Raises:
+			KafkaException:	The background thread stopped on a consumer error.
+
+		Example:
+
+			..sourcecode ::
+
+				consumer.start_indexing(header_names=['correlation-id'])
+				...
+				msg = consumer.await_message(header=('correlation-id', correlation_id), timeout=10.0)
+				assert_kafka_message(msg, event_type='OrderCreated')
+
+		"""
+		if self._index is None:
+			self.start_indexing()
+
+		msg, _ = self._await_indexed(key, header, predicate, timeout)
+		return msg
+
+
+	def _await_indexed(self, key=None, header=None, predicate=None, timeout: float = 60.0, start: int = 0) -> tuple:
+		# pylint: disable=too-many-arguments
+
+		deadline = time.monotonic() + timeout
+		with self._index.condition:
+			while True:
+				msg, start = self._index.find(key, header, predicate, start)
+				if msg is not None:
+					return msg, start
+				if self._indexing_error is not None:
+					raise self._indexing_error
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					return None, start
+				self._index.condition.wait(remaining)
+
+
+	def _index_messages(self):
+
+		try:
+			while not self._indexing_stop.is_set():
+				msg = self._poll_iteration(0.1)
+				if msg:
+					self._index.add(msg)
+		except KafkaException as e:
+			with self._index.condition:
+				self._indexing_error = e
+				self._index.condition.notify_all()
 
 
 	def close(self):
 
+		if self._indexing_thread is not None:
+			self._indexing_stop.set()
+			self._indexing_thread.join()
 		self.consumer.close()
 
 
+class KafkaCursor():
+	"""View of a `KafkaConsumerPool` consumer that only sees messages produced after it
+	was created.
+
+	Messages are not removed from the pool, so several cursors on the same topics see the
+	same messages.
+
+	"""
+	def __init__(self, consumer: KafkaConsumer, timeout: float = 10.0):
+
+		self._consumer = consumer
+		# Offsets of the next message of every assigned partition
+		self._start_offsets = {}
+		for partition in consumer.consumer.assignment():
+			_, high = consumer.consumer.get_watermark_offsets(partition, timeout=timeout)
+			self._start_offsets[(partition.topic, partition.partition)] = high
+		with consumer._index.condition:	# pylint: disable=protected-access
+			self._created_position = consumer._index.end	# pylint: disable=protected-access
+		self._position = self._created_position
+
+	def consume_one(self, timeout: float = 60.0) -> Optional[Message]:
+		"""Returns the next message, or None if no message arrived within `timeout`. """
+
+		msg, self._position = self._consumer._await_indexed(	# pylint: disable=protected-access
+			predicate=self._visible, timeout=timeout, start=self._position
+		)
+		return msg
+
+	def consume_many(self, num_messages: int, timeout: float = 2.0) -> deque[Message]:
+		"""Returns up to `num_messages` next messages, in arrival order, within `timeout`. """
+
+		msgs = deque()
+		deadline = time.monotonic() + timeout
+		while len(msgs) < num_messages:
+			msg = self.consume_one(max(deadline - time.monotonic(), 0))
+			if msg is None:
+				break
+			msgs.append(msg)
+		return msgs
+
+	def await_message(self,
+			key: Optional[Union[str, bytes]] = None,
+			header: Optional[tuple] = None,
+			predicate: Optional[Callable[[Message], bool]] = None,
+			timeout: float = 60.0) -> Optional[Message]:
+		"""See `KafkaConsumer.await_message()`. The cursor position is not changed. """
+
+		def visible_predicate(msg: Message) -> bool:
+			return self._visible(msg) and (predicate is None or predicate(msg))
+
+		msg, _ = self._consumer._await_indexed(	# pylint: disable=protected-access
+			key, header, visible_predicate, timeout, self._created_position
+		)
+		return msg
+
+	def _visible(self, msg: Message) -> bool:
+
+		return msg.offset() >= self._start_offsets.get((msg.topic(), msg.partition()), 0)
+
+
+class KafkaConsumerPool():
+	"""Long-lived consumers shared by the tests of a session.
+
+	There is one indexing `KafkaConsumer` per set of topics, so the consumer group join
+	and partition assignment are paid once per session instead of once per test. Tests
+	get a `KafkaCursor` that only sees the messages produced after its creation.
+
+	Example:
+
+		..sourcecode ::
+
+			@pytest.fixture(scope='session')
+			def kafka_pool():
+				pool = KafkaConsumerPool(header_names=['correlation-id'])
+				yield pool
+				pool.close()
+
+			def test_order_created(kafka_pool, orders_client):
+				cursor = kafka_pool.cursor(['orders'])
+				orders_client.request(RestRequest('POST', '/orders', order_payload))
+				assert_kafka_message(cursor.consume_one(timeout=4.0), event_type='OrderCreated')
+
+	"""
+	def __init__(self, bootstrap_servers=None, config=None, header_names: Iterable[str] = (),
+			max_messages: int = 100_000, codecs: Optional[CodecRegistry] = None):
+		# pylint: disable=too-many-arguments
+		"""
+
+		Args:
+			bootstrap_servers (str, optional):	See `KafkaConsumer`.
+			config (dict, optional):		See `KafkaConsumer`.
+			header_names (Iterable[str]):		Headers indexed for `await_message()`.
+			max_messages (int):			Maximum number of messages kept per consumer.
+			codecs (CodecRegistry, optional):	See `KafkaConsumer`.
+
+		"""
+		self._bootstrap_servers = bootstrap_servers
+		self._config = config
+		self._header_names = tuple(header_names)
+		self._max_messages = max_messages
+		self._codecs = codecs
+		self._consumers = {}
+		self._lock = threading.Lock()
+
+	def cursor(self, topics: list[str]) -> KafkaCursor:
+		"""Returns a cursor on `topics` starting now, creating their consumer if needed. """
+
+		topic_set = frozenset(topics)
+		with self._lock:
+			consumer = self._consumers.get(topic_set)
+			if consumer is None:
+				consumer = KafkaConsumer(sorted(topic_set), self._bootstrap_servers, config=self._config, codecs=self._codecs)
+				consumer.start_indexing(self._header_names, self._max_messages)
+				self._consumers[topic_set] = consumer
+
+		return KafkaCursor(consumer)
+
+	def close(self):
+		"""Closes all the consumers. """
+
+		with self._lock:
+			for consumer in self._consumers.values():
+				consumer.close()
+			self._consumers.clear()
+
+
+class DeliveryReport():
+	"""Delivery results of `KafkaProducer.produce_many()`.
+
+	Attributes:
+		delivered (int):		Messages acknowledged by the broker.
+		failed (int):			Messages whose delivery failed.
+		undelivered (int):		Messages still queued when the final flush timed out.
+		errors (list[KafkaError]):	First delivery errors.
+		latency (LatencyHistogram):	Seconds from `produce()` to the delivery report of
+			every delivered message.
+		elapsed (float):		Seconds from the first message to the final flush.
+
+	"""
+	def __init__(self):
+
+		self.delivered = 0
+		self.failed = 0
+		self.undelivered = 0
+		self.errors = []
+		self.latency = LatencyHistogram()
+		self.elapsed = 0.0
+
+	@property
+	def throughput(self) -> float:
+		"""Delivered messages per second. """
+
+		return self.delivered / self.elapsed if self.elapsed else 0.0
+
+	def __str__(self):
+		return (
+			f'DeliveryReport(delivered={self.delivered}, failed={self.failed},'
+			f' undelivered={self.undelivered}, throughput={self.throughput:.0f}/s, latency={self.latency})'
+		)
+
+
 class KafkaProducer():
 
 	def __init__(self,
 	      		bootstrap_servers=None,
-			config=None):
+			config=None,
+			linger_ms: float = 0,
+			latency_probe: bool = False,
+			codecs: Optional[CodecRegistry] = None):
+		"""
+
+		Args:
+			bootstrap_servers (str, optional):
+
+			config (dict, optional):
+
+			latency_probe (bool, optional):	If True, messages are stamped with headers
+				for `LatencyProbe`: the producer id, a sequence number per topic and the
+				send time.
+
+			linger_ms (float, optional):	Milliseconds librdkafka waits to batch messages
+				(`queue.buffering.max.ms`). Ignored if `config` is provided. Messages
+				produced with `produce_many()` are batched even when it is 0, but a few
+				milliseconds increase batch sizes.
 
+			codecs (CodecRegistry, optional):	If provided, values other than `bytes`
+				and `str` are encoded with the codec of their topic.
+
+		"""
 		if bootstrap_servers is None:
 			bootstrap_servers = 'localhost:9093'
 		if config is None:
 			config = {
 				'bootstrap.servers': bootstrap_servers,
-				"queue.buffering.max.ms": 0,
+				"queue.buffering.max.ms": linger_ms,
 				"acks": -1
 			}
-		self._producer = Producer(**config)
+		self._producer = MemoryProducer(**config) if is_memory_config(config) else Producer(**config)
+
+		self.codecs = codecs
+		self._probe_id = uuid.uuid4().hex[:8].encode() if latency_probe else None
+		self._probe_sequences = {}
 
 
 	def produce(self, topic, key=None, value=None, partition=-1, timestamp=0, headers=None):
 		# pylint: disable=too-many-arguments
-		"""
+		"""Produces a message and waits until it is delivered.
 
 		Raises:
 			BufferError
@@ -230,43 +1221,147 @@ class KafkaProducer():
 			NotImplementedError
 
 		"""
+		if self.codecs is not None:
+			value = self.codecs.encode(topic, value)
+		if self._probe_id is not None:
+			headers = self._stamp(topic, headers)
 		self._producer.produce(topic, value, key, partition, timestamp=timestamp, headers=headers)
 		self._producer.flush()
 
 
+	def produce_many(self,
+			topic: str,
+			messages: Iterable[tuple],
+			partition: int = -1,
+			headers=None,
+			flush_timeout: float = 60.0,
+			max_errors: int = 10) -> DeliveryReport:
+		# pylint: disable=too-many-arguments
+		"""Produces messages asynchronously and waits once for all of them to be delivered.
+
+		Delivery reports are tracked with callbacks, so librdkafka batches the messages
+		instead of flushing each of them.
+
+		Args:
+			topic (str):			Topic name.
+			messages (Iterable[tuple]):	`(key, value)` pairs. Values are encoded as in
+				`produce()`.
+			partition (int):		Partition, or -1 to use the configured partitioner.
+			headers (optional):		Headers of every message.
+			flush_timeout (float):		Maximum seconds to wait for the final flush.
+			max_errors (int):		Number of delivery errors kept in the report.
+
+		Returns:
+			DeliveryReport:	Delivery counts and latencies.
+
+		Raises:
+			KafkaException
+
+		Example:
+
+			..sourcecode ::
+
+				producer = KafkaProducer(linger_ms=5)
+				report = producer.produce_many('orders', ((f'{i}', order(i)) for i in range(1_000_000)))
+
+				assert report.delivered == 1_000_000, report
+
+		"""
+		report = DeliveryReport()
+
+		def on_delivery(error: Optional[KafkaError], _msg: Message, produced: float):
+			if error is None:
+				report.delivered += 1
+				report.latency.record(time.perf_counter() - produced)
+			else:
+				report.failed += 1
+				if len(report.errors) < max_errors:
+					report.errors.append(error)
+
+		codec = self.codecs.codec_for(topic) if self.codecs is not None else None
+		start = time.perf_counter()
+		for key, value in messages:
+			if codec is not None and value is not None and not isinstance(value, (bytes, str)):
+				value = codec.encode(value)
+			produced = time.perf_counter()
+			callback = lambda error, msg, produced=produced: on_delivery(error, msg, produced)	# pylint: disable=unnecessary-lambda-assignment
+			msg_headers = self._stamp(topic, headers) if self._probe_id is not None else headers
+			while True:
+				try:
+					self._producer.produce(topic, value, key, partition, on_delivery=callback, headers=msg_headers)
+					break
+				except BufferError:
+					# Local queue is full, serve delivery reports to make room
+					self._producer.poll(0.1)
+			self._producer.poll(0)
+
+		report.undelivered = self._producer.flush(flush_timeout)
+		report.elapsed = time.perf_counter() - start
+
+		return report
+
+
+	def _stamp(self, topic: str, headers) -> list:
+
+		sequences = self._probe_sequences.get(topic)
+		if sequences is None:
+			sequences = self._probe_sequences.setdefault(topic, itertools.count())
+
+		stamped = list(headers.items() if isinstance(headers, dict) else headers or ())
+		stamped.append((PROBE_PRODUCER_HEADER, self._probe_id))
+		stamped.append((PROBE_SEQUENCE_HEADER, str(next(sequences)).encode()))
+		stamped.append((PROBE_SENT_HEADER, str(time.time_ns()).encode()))
+		return stamped
+
+
 def assert_kafka_message(
-		msg: Message,
+		msg: Union[Message, KafkaMessage],
 		expected_json_instance=None,
 		expected_json_schema=None,
+		codec: Codec = JSON,
 		**kwargs):
-	"""Asserts the contents of a JSON message consumed from Kafka.
+	"""Asserts the decoded contents of a message consumed from Kafka.
 
 	Args:
-		msg (Message):
+		msg (Message or KafkaMessage):	Wrapping messages asserted several times in
+			`KafkaMessage` avoids decoding them again.
 
 		expected_json_instance (dict, optional): The expected JSON instance to compare with.
 
 		expected_json_schema (dict, optional):	The expected JSON schema to validate with.
 
+		codec (Codec, optional):		Codec of `msg` if it is not a `KafkaMessage`.
+			Defaults to JSON.
+
 		**kwargs (dict):			Additional keyword arguments to compare
 			specific property values. Property names should be provided as keys, and
-			expected values as values.
+			expected values as values. Nested properties can be referenced with dotted
+			paths or JSON pointers, e.g. `**{'data.order.id': 5}`.
 
 	Raises:
 		AssertionError		The assertion failed.
 
-		JSONDecodeError		Error decoding the JSON content of the message.
+		ValueError		Error decoding the message. `JSONDecodeError` with the JSON
+			codec.
 
 	"""
 	assert msg, 'No Kafka message provided. If you called consume_one() or consume_many() they timed out.'
 
-	json_instance = json.loads(msg.value())
+	if not isinstance(msg, KafkaMessage):
+		msg = KafkaMessage(msg, codec)
+	json_instance = msg.decoded
 
 	if expected_json_instance or expected_json_schema:
 		assert_json(json_instance, expected_json_instance, expected_json_schema)
 
 	for key, expected_value in kwargs.items():
-		actual_value = json_instance[key]
+		if isinstance(json_instance, dict) and key in json_instance:
+			actual_value = json_instance[key]
+		else:
+			try:
+				actual_value = get_json_path(json_instance, compile_json_path(key))
+			except (KeyError, IndexError, ValueError, TypeError) as e:
+				raise AssertionError(f'Expected property `{key}` not found in Kafka message {json_instance}') from e
 		assert actual_value == expected_value,	\
 			(
 				f'Expected property `{key}` was `{expected_value}` but got `{actual_value}`'
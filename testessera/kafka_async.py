@@ -0,0 +1,219 @@
+from typing import Optional, Union
+from collections import deque
+import asyncio
+import threading
+from confluent_kafka import Message, KafkaException
+from testessera.kafka import KafkaConsumer
+
+
+_CLOSED = object()
+
+_MAX_BATCH = 1000
+
+
+class AsyncKafkaConsumer():
+	"""asyncio counterpart of `KafkaConsumer`.
+
+	A dedicated thread polls the underlaying `KafkaConsumer` and hands messages over to
+	the event loop in batches, without waiting for it, so the event loop is never
+	blocked. Configuration defaults and the topic-to-queue mapping are those of
+	`KafkaConsumer`.
+
+	Attributes:
+		consumer (KafkaConsumer):	Underlaying `KafkaConsumer`.
+
+	Example:
+
+		..sourcecode ::
+
+			async with AsyncKafkaConsumer(topics=['orders']) as consumer:
+				await orders_client.request(RestRequest('POST', '/orders', order_payload))
+
+				msg = await consumer.consume_one(timeout=4.0)
+				assert_kafka_message(msg, event_type='OrderCreated')
+
+				async for msg in consumer:
+					...
+
+	"""
+	def __init__(self,
+			topics: Union[list[str], dict[str, deque]],
+			bootstrap_servers=None,
+			group_id=None,
+			config=None,
+			assignment_timeout: float = 30.0,
+			max_queued: int = 10_000,
+			codecs=None):
+		# pylint: disable=too-many-arguments
+		"""
+
+		Args:
+			max_queued (int):	Maximum number of messages handed over to the event loop
+				and not consumed yet. The polling thread waits when it is reached.
+
+		See `KafkaConsumer` for the rest of arguments.
+
+		"""
+		self.consumer = KafkaConsumer(None, bootstrap_servers, group_id, config, codecs=codecs)
+		self._topics = topics
+		self._assignment_timeout = assignment_timeout
+		self._max_queued = max_queued
+		# A slot per message handed over and not consumed yet
+		self._slots = threading.Semaphore(max_queued)
+		self._queue = None
+		self._thread = None
+		self._stop = threading.Event()
+		self._closed = False
+
+
+	async def __aenter__(self):
+
+		await self.start()
+		return self
+
+
+	async def __aexit__(self, *exc_info):
+
+		await self.aclose()
+
+
+	def __aiter__(self):
+
+		return self
+
+
+	async def __anext__(self) -> Message:
+
+		msg = await self._get()
+		if msg is None:
+			raise StopAsyncIteration
+		return msg
+
+
+	async def start(self):
+		"""Subscribes to the topics and starts the polling thread.
+
+		Raises:
+			KafkaException
+
+			TimeoutError	Partitions were not assigned in time.
+
+		"""
+		loop = asyncio.get_running_loop()
+		await loop.run_in_executor(None, self.consumer.subscribe, self._topics, self._assignment_timeout)
+
+		# Bounded by `_slots` instead, so that the polling thread never waits for the loop
+		self._queue = asyncio.Queue()
+		self._thread = threading.Thread(target=self._poll, args=(loop,), daemon=True)
+		self._thread.start()
+
+
+	async def consume_one(self, timeout: float = 60.0) -> Optional[Message]:
+		"""Returns the next message, or None if no message is received within `timeout`
+		or the consumer is closed.
+
+		Raises:
+			KafkaException:	The consumer reported an error other than partition EOF.
+				Polling stops, so it is raised again by later calls.
+
+		"""
+		try:
+			return await asyncio.wait_for(self._get(), timeout)
+		except asyncio.TimeoutError:
+			return None
+
+
+	async def consume_many(self, num_messages: int, timeout: float = 2.0) -> deque[Message]:
+		"""Returns up to `num_messages` messages, in arrival order, received within `timeout`.
+
+		Raises:
+			KafkaException:	The consumer reported an error other than partition EOF.
+
+		"""
+		loop = asyncio.get_running_loop()
+		deadline = loop.time() + timeout
+		msgs = deque()
+		while len(msgs) < num_messages:
+			msg = await self.consume_one(max(deadline - loop.time(), 0))
+			if msg is None:
+				break
+			msgs.append(msg)
+		return msgs
+
+
+	async def aclose(self):
+		"""Stops the polling thread and closes the consumer. """
+
+		if self._closed:
+			return
+		self._closed = True
+
+		self._stop.set()
+		if self._thread is not None:
+			await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+			# Wake up pending consumers
+			self._queue.put_nowait(_CLOSED)
+		self.consumer.close()
+
+
+	async def _get(self) -> Optional[Message]:
+
+		if self._queue is None:
+			raise RuntimeError('AsyncKafkaConsumer not started')
+
+		item = await self._queue.get()
+		if item is _CLOSED:
+			self._queue.put_nowait(_CLOSED)
+			return None
+		if isinstance(item, KafkaException):
+			# The polling thread stopped on it, so every later call raises it too
+			self._queue.put_nowait(item)
+			raise item
+		self._slots.release()
+		return item
+
+
+	def _put_batch(self, batch: list):
+
+		for item in batch:
+			self._queue.put_nowait(item)
+
+
+	def _poll(self, loop: asyncio.AbstractEventLoop):
+
+		while not self._stop.is_set():
+			if not self._slots.acquire(timeout=0.1):
+				continue
+			size = 1
+			while size < _MAX_BATCH and self._slots.acquire(blocking=False):
+				size += 1
+
+			batch = []
+			try:
+				self._poll_batch(batch, size)
+			except KafkaException as e:
+				loop.call_soon_threadsafe(self._put_batch, batch + [e])
+				return
+			finally:
+				for _ in range(size - len(batch)):
+					self._slots.release()
+			if batch:
+				loop.call_soon_threadsafe(self._put_batch, batch)
+
+
+	def _poll_batch(self, batch: list, size: int):
+		# pylint: disable=protected-access
+
+		# Waits for the first message only, and takes those already fetched after it
+		msg = self.consumer._poll_iteration(0.1)
+		if not msg:
+			return
+		batch.append(msg)
+		pending = self.consumer._pending
+		while pending and len(batch) < size:
+			batch.append(pending.popleft())
+		if len(batch) < size:
+			for msg in self.consumer.consumer.consume(size - len(batch), 0):
+				msg = self.consumer._accept(msg)
+				if msg is not None:
+					batch.append(msg)
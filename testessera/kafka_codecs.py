@@ -0,0 +1,264 @@
+"""Provides codecs of Kafka message values.
+
+A `CodecRegistry` maps topics to codecs. Consumers given a registry return messages
+wrapped in `KafkaMessage`, which decode their value with the codec of their topic on first
+access, so filtering a large batch only decodes the messages that are inspected.
+Producers given a registry encode values that are not `bytes` or `str`:
+
+	..sourcecode ::
+
+		codecs = CodecRegistry()
+		codecs.register('orders', AvroCodec('schemas/order.avsc'))
+		codecs.register('stock-*', MessagePackCodec())
+
+		consumer = KafkaConsumer(topics=['orders'], codecs=codecs)
+		producer = KafkaProducer(codecs=codecs)
+
+		producer.produce('orders', value={'id': 5, 'event_type': 'OrderCreated'})
+		assert_kafka_message(consumer.consume_one(timeout=4.0), event_type='OrderCreated')
+
+`MessagePackCodec` requires `msgpack`, `AvroCodec` requires `fastavro` and the `orjson`
+backend of `JsonCodec` requires `orjson`.
+
+"""
+from typing import Optional, Union
+from fnmatch import fnmatchcase
+import threading
+import struct
+import json
+import io
+import os
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+try:
+	import msgpack
+except ImportError:
+	msgpack = None
+
+try:
+	import fastavro
+	import fastavro.schema
+except ImportError:
+	fastavro = None
+
+
+_CONFLUENT_MAGIC = 0
+_CONFLUENT_HEADER = struct.Struct('>bI')
+
+
+class Codec():
+	"""Base codec. Subclasses implement `decode()` and `encode()`. """
+
+	name = None
+
+	def decode(self, data: bytes):
+		"""Returns the value encoded in `data`. """
+
+		raise NotImplementedError
+
+	def encode(self, value) -> bytes:
+		"""Returns `value` encoded. """
+
+		raise NotImplementedError
+
+	def __str__(self):
+		return f'{self.__class__.__name__}()'
+
+
+class JsonCodec(Codec):
+	"""JSON codec.
+
+	The `orjson` backend is faster but decodes differently from `json`: integers beyond
+	64 bits become floats and `NaN` or `Infinity` are rejected.
+
+	Attributes:
+		backend (str):	`json` (default) or `orjson`.
+
+	Raises:
+		ValueError:	Unknown backend.
+		ImportError:	The `orjson` backend is requested but `orjson` is not installed.
+
+	"""
+	name = 'json'
+
+	def __init__(self, backend: str = 'json'):
+
+		if backend not in ('json', 'orjson'):
+			raise ValueError(f'Unknown JSON backend `{backend}`')
+		if backend == 'orjson' and orjson is None:
+			raise ImportError('The orjson backend of JsonCodec requires orjson')
+		self.backend = backend
+
+	def decode(self, data: bytes):
+
+		return orjson.loads(data) if self.backend == 'orjson' else json.loads(data)
+
+	def encode(self, value) -> bytes:
+
+		return orjson.dumps(value) if self.backend == 'orjson' else json.dumps(value).encode()
+
+	def __str__(self):
+		return f'JsonCodec({self.backend})'
+
+
+class MessagePackCodec(Codec):
+	"""MessagePack codec.
+
+	Raises:
+		ImportError:	`msgpack` is not installed.
+
+	"""
+	name = 'msgpack'
+
+	def __init__(self):
+
+		if msgpack is None:
+			raise ImportError('MessagePackCodec requires msgpack')
+
+	def decode(self, data: bytes):
+
+		return msgpack.unpackb(data, raw=False)
+
+	def encode(self, value) -> bytes:
+
+		return msgpack.packb(value, use_bin_type=True)
+
+
+class AvroCodec(Codec):
+	"""Avro codec of a single schema.
+
+	Schemas read from `.avsc` files are parsed once per process and file version, and
+	named types defined in other `.avsc` files of the same directory are resolved.
+
+	Attributes:
+		schema (dict):			Parsed schema.
+		schema_id (int, optional):	Schema registry id. If set, values use the
+			Confluent wire format: a zero byte and the id precede the Avro record.
+
+	Raises:
+		ImportError:	`fastavro` is not installed.
+
+	"""
+	name = 'avro'
+
+	_schemas = {}
+	_schemas_lock = threading.Lock()
+
+	def __init__(self, schema: Union[str, dict], schema_id: Optional[int] = None):
+		"""
+
+		Args:
+			schema (str or dict):		Path of an `.avsc` file, or schema.
+			schema_id (int, optional):	See `schema_id`.
+
+		"""
+		if fastavro is None:
+			raise ImportError('AvroCodec requires fastavro')
+
+		self.schema = self.load_schema(schema) if isinstance(schema, str) else fastavro.parse_schema(schema)
+		self.schema_id = schema_id
+
+	@classmethod
+	def load_schema(cls, path: str) -> dict:
+		"""Returns the parsed schema of the `.avsc` file `path`, cached until it changes. """
+
+		path = os.path.realpath(path)
+		key = (path, os.stat(path).st_mtime_ns)
+		schema = cls._schemas.get(key)
+		if schema is None:
+			schema = fastavro.schema.load_schema(path)
+			with cls._schemas_lock:
+				cls._schemas[key] = schema
+		return schema
+
+	def decode(self, data: bytes):
+		"""
+
+		Raises:
+			ValueError:	`data` does not start with the Confluent wire format header of
+				`schema_id`.
+
+		"""
+		buffer = io.BytesIO(data)
+		if self.schema_id is not None:
+			magic, schema_id = _CONFLUENT_HEADER.unpack(buffer.read(_CONFLUENT_HEADER.size))
+			if magic != _CONFLUENT_MAGIC or schema_id != self.schema_id:
+				raise ValueError(f'Expected Avro value of schema {self.schema_id} but got schema {schema_id}')
+		return fastavro.schemaless_reader(buffer, self.schema)
+
+	def encode(self, value) -> bytes:
+
+		buffer = io.BytesIO()
+		if self.schema_id is not None:
+			buffer.write(_CONFLUENT_HEADER.pack(_CONFLUENT_MAGIC, self.schema_id))
+		fastavro.schemaless_writer(buffer, self.schema, value)
+		return buffer.getvalue()
+
+	def __str__(self):
+		name = self.schema.get('name') if isinstance(self.schema, dict) else self.schema
+		return f'AvroCodec({name}, schema_id={self.schema_id})'
+
+
+JSON = JsonCodec()
+"""JsonCodec: Default codec. """
+
+
+class CodecRegistry():
+	"""Codecs by topic.
+
+	Topics are registered by name or by `fnmatch` pattern. The first registered pattern
+	matching a topic wins over the default codec. Lookups are cached per topic.
+
+	Attributes:
+		default (Codec, optional):	Codec of the topics not registered.
+
+	"""
+	def __init__(self, default: Optional[Codec] = JSON):
+
+		self.default = default
+		self._codecs = {}
+		self._patterns = []
+		self._resolved = {}
+
+	def register(self, topic: str, codec: Codec) -> 'CodecRegistry':
+		"""Sets the codec of `topic`, which may be a pattern like `orders-*`. Returns self. """
+
+		if any(char in topic for char in '*?['):
+			self._patterns.append((topic, codec))
+		else:
+			self._codecs[topic] = codec
+		self._resolved = {}
+		return self
+
+	def codec_for(self, topic: str) -> Codec:
+		"""Returns the codec of `topic`.
+
+		Raises:
+			LookupError:	No codec is registered for `topic` and there is no default.
+
+		"""
+		codec = self._resolved.get(topic)
+		if codec is None:
+			codec = self._codecs.get(topic)
+			if codec is None:
+				codec = next((codec_ for pattern, codec_ in self._patterns if fnmatchcase(topic, pattern)), self.default)
+			if codec is None:
+				raise LookupError(f'No codec registered for topic `{topic}`')
+			self._resolved[topic] = codec
+		return codec
+
+	def decode(self, topic: str, data: bytes):
+		"""Decodes a value of `topic`. """
+
+		return self.codec_for(topic).decode(data)
+
+	def encode(self, topic: str, value) -> bytes:
+		"""Encodes a value of `topic`. `bytes` and `str` values are returned unchanged. """
+
+		if value is None or isinstance(value, (bytes, str)):
+			return value
+		return self.codec_for(topic).encode(value)
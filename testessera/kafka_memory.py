@@ -0,0 +1,510 @@
+"""Provides an in-process Kafka broker for suites that don't need a real one.
+
+`KafkaConsumer` and `KafkaProducer` use it when their bootstrap servers start with
+`memory://`. Every distinct bootstrap string is a separate broker, shared by all the
+consumers and producers of the process:
+
+	..sourcecode ::
+
+		producer = KafkaProducer(bootstrap_servers='memory://')
+		consumer = KafkaConsumer(topics=['orders'], bootstrap_servers='memory://')
+
+		producer.produce('orders', value=b'{"event_type": "OrderCreated"}')
+		assert_kafka_message(consumer.consume_one(timeout=1.0), event_type='OrderCreated')
+
+`MemoryConsumer` and `MemoryProducer` implement the subset of the
+`confluent_kafka.Consumer` and `confluent_kafka.Producer` interfaces used by testessera:
+topics, partitions, offsets, headers, partition EOF events and consumer groups with
+range assignment.
+
+"""
+from typing import Callable, Optional
+import itertools
+import threading
+import time
+import uuid
+import zlib
+from confluent_kafka import (
+	KafkaError,
+	KafkaException,
+	TopicPartition,
+	OFFSET_BEGINNING,
+	OFFSET_END,
+	OFFSET_INVALID,
+	TIMESTAMP_CREATE_TIME
+)
+
+
+MEMORY_SCHEME = 'memory://'
+"""str: Bootstrap servers prefix that selects the in-process broker. """
+
+
+def is_memory_config(config: dict) -> bool:
+	"""Returns True if `config` selects the in-process broker. """
+
+	return str(config.get('bootstrap.servers', '')).startswith(MEMORY_SCHEME)
+
+
+class MemoryMessage():
+	"""Message of the in-process broker, with the `confluent_kafka.Message` interface. """
+
+	__slots__ = ('_topic', '_partition', '_offset', '_key', '_value', '_headers', '_timestamp', '_error')
+
+	def __init__(self, topic, partition, offset, key=None, value=None, headers=None, timestamp=0, error=None):
+		# pylint: disable=too-many-arguments
+
+		self._topic = topic
+		self._partition = partition
+		self._offset = offset
+		self._key = key
+		self._value = value
+		self._headers = headers
+		self._timestamp = timestamp
+		self._error = error
+
+	def topic(self):
+		return self._topic
+
+	def partition(self):
+		return self._partition
+
+	def offset(self):
+		return self._offset
+
+	def key(self):
+		return self._key
+
+	def value(self):
+		return self._value
+
+	def headers(self):
+		return self._headers
+
+	def timestamp(self):
+		return (TIMESTAMP_CREATE_TIME, self._timestamp)
+
+	def error(self):
+		return self._error
+
+	def __len__(self):
+		return len(self._value or b'')
+
+
+class _Group():
+
+	def __init__(self):
+
+		self.members = {}
+		self.positions = {}
+		self.generation = 0
+		self.committed = {}
+
+
+class MemoryBroker():
+	"""In-process Kafka broker.
+
+	Topics are created on first use with `default_partitions` partitions, or explicitly
+	with `create_topic()`.
+
+	"""
+	_brokers = {}
+	_brokers_lock = threading.Lock()
+
+	def __init__(self, default_partitions: int = 1):
+
+		self.default_partitions = default_partitions
+		# Reentrant so that assignment callbacks can call back into the consumer
+		self._lock = threading.RLock()
+		self.condition = threading.Condition(self._lock)
+		self._topics = {}
+		self._groups = {}
+		# Consumers blocked in `wait()`, so appends skip notifying when there are none
+		self._waiters = 0
+
+	@classmethod
+	def get(cls, bootstrap_servers: str = MEMORY_SCHEME) -> 'MemoryBroker':
+		"""Returns the broker of `bootstrap_servers`, creating it if needed. """
+
+		with cls._brokers_lock:
+			broker = cls._brokers.get(bootstrap_servers)
+			if broker is None:
+				broker = cls._brokers[bootstrap_servers] = MemoryBroker()
+			return broker
+
+	def create_topic(self, topic: str, num_partitions: Optional[int] = None):
+		"""Creates `topic` if it doesn't exist. """
+
+		with self.condition:
+			if topic not in self._topics:
+				self._topics[topic] = [[] for _ in range(num_partitions or self.default_partitions)]
+
+	def partitions(self, topic: str) -> list:
+		"""Returns the partition logs of `topic`, creating it if needed. """
+
+		logs = self._topics.get(topic)
+		if logs is None:
+			self.create_topic(topic)
+			logs = self._topics[topic]
+		return logs
+
+	def reset(self):
+		"""Deletes all topics, messages and consumer groups. """
+
+		with self.condition:
+			self._topics.clear()
+			self._groups.clear()
+
+	def append(self, topic: str, partition: int, key, value, headers, timestamp: int, round_robin=None) -> MemoryMessage:
+		# pylint: disable=too-many-arguments
+		"""Appends a message. Without partition, keyed messages are partitioned by the hash
+		of their key and the rest by `round_robin`, an iterator of integers, or to
+		partition 0.
+
+		"""
+		with self._lock:
+			logs = self._topics.get(topic) or self.partitions(topic)
+			if partition < 0:
+				if key is not None:
+					partition = zlib.crc32(key) % len(logs)
+				else:
+					partition = next(round_robin) % len(logs) if round_robin is not None else 0
+			elif partition >= len(logs):
+				raise KafkaException(KafkaError(KafkaError._UNKNOWN_PARTITION))	# pylint: disable=protected-access
+			log = logs[partition]
+			msg = MemoryMessage(topic, partition, len(log), key, value, headers, timestamp)
+			log.append(msg)
+			if self._waiters:
+				self.condition.notify_all()
+		return msg
+
+	def wait(self, timeout: Optional[float] = None):
+		"""Waits until a message is appended or a group rebalances. `condition` must be
+		held.
+
+		"""
+		self._waiters += 1
+		try:
+			self.condition.wait(timeout)
+		finally:
+			self._waiters -= 1
+
+	def group(self, group_id: str) -> _Group:
+
+		group = self._groups.get(group_id)
+		if group is None:
+			group = self._groups[group_id] = _Group()
+		return group
+
+	def join(self, group_id: str, member_id: str, topics: list, positions: Callable[[], dict]):
+		"""Adds a member to a group. `positions` returns its positions by `(topic, partition)`. """
+
+		with self.condition:
+			group = self.group(group_id)
+			self._rebalance(group)
+			group.members[member_id] = list(topics)
+			group.positions[member_id] = positions
+
+	def leave(self, group_id: str, member_id: str):
+
+		with self.condition:
+			group = self.group(group_id)
+			if member_id in group.members:
+				self._rebalance(group)
+				del group.members[member_id]
+				del group.positions[member_id]
+
+	def _rebalance(self, group: _Group):
+
+		# Rebalances are eager: members stop fetching and their positions are committed
+		# before any partition is reassigned, as their revocation would do
+		for positions in group.positions.values():
+			group.committed.update(positions())
+		group.generation += 1
+		self.condition.notify_all()
+
+	def assignment(self, group_id: str, member_id: str) -> list:
+		"""Returns the `(topic, partition)` pairs of a member, with range assignment. """
+
+		group = self.group(group_id)
+		assigned = []
+		for topic in sorted(group.members.get(member_id, ())):
+			members = sorted(member for member, topics in group.members.items() if topic in topics)
+			num_partitions = len(self.partitions(topic))
+			index = members.index(member_id)
+			per_member, extra = divmod(num_partitions, len(members))
+			start = index * per_member + min(index, extra)
+			end = start + per_member + (1 if index < extra else 0)
+			assigned.extend((topic, partition) for partition in range(start, end))
+		return assigned
+
+
+def _to_bytes(value):
+
+	if isinstance(value, str):
+		return value.encode()
+	if value is None or isinstance(value, bytes):
+		return value
+	# As `confluent_kafka.Producer`, so that suites do not pass here and fail on a real broker
+	raise TypeError(f"a bytes-like object is required, not '{type(value).__name__}'")
+
+
+class MemoryConsumer():
+	"""`confluent_kafka.Consumer` counterpart for `MemoryBroker`. """
+
+	def __init__(self, **config):
+
+		self._broker = MemoryBroker.get(config['bootstrap.servers'])
+		self._group_id = config.get('group.id', 'testessera')
+		self._member_id = uuid.uuid4().hex
+		topic_config = config.get('default.topic.config', {})
+		self._auto_offset_reset = config.get('auto.offset.reset', topic_config.get('auto.offset.reset', 'latest'))
+		self._partition_eof = config.get('enable.partition.eof', False)
+		self._subscribed = False
+		self._generation = None
+		self._assigned = None
+		self._on_assign = None
+		self._on_revoke = None
+		self._positions = {}
+		self._paused = set()
+		self._eof_reported = set()
+		self._closed = False
+
+	def subscribe(self, topics: list, on_assign: Optional[Callable] = None, on_revoke: Optional[Callable] = None):
+
+		self._check_open()
+		self._on_assign = on_assign
+		self._on_revoke = on_revoke
+		self._subscribed = True
+		self._broker.join(self._group_id, self._member_id, topics, lambda: self._positions)
+
+	def unsubscribe(self):
+
+		self._subscribed = False
+		self._assigned = None
+		self._broker.leave(self._group_id, self._member_id)
+		self.unassign()
+
+	def assign(self, partitions: list):
+
+		with self._broker.condition:
+			self._positions = {}
+			self._paused = set()
+			self._eof_reported = set()
+			for partition in partitions:
+				self._positions[(partition.topic, partition.partition)] = self._initial_position(partition)
+
+	def unassign(self):
+
+		with self._broker.condition:
+			self._positions = {}
+			self._paused = set()
+			self._eof_reported = set()
+
+	def pause(self, partitions: list):
+
+		with self._broker.condition:
+			self._paused.update((p.topic, p.partition) for p in partitions)
+
+	def resume(self, partitions: list):
+
+		with self._broker.condition:
+			self._paused.difference_update((p.topic, p.partition) for p in partitions)
+			self._broker.condition.notify_all()
+
+	def assignment(self) -> list:
+
+		return [TopicPartition(topic, partition) for topic, partition in self._positions]
+
+	def position(self, partitions: list) -> list:
+
+		return [
+			TopicPartition(p.topic, p.partition, self._positions.get((p.topic, p.partition), OFFSET_END))
+			for p in partitions
+		]
+
+	def seek(self, partition: TopicPartition):
+
+		with self._broker.condition:
+			key = (partition.topic, partition.partition)
+			if key not in self._positions:
+				raise KafkaException(KafkaError(KafkaError._STATE))	# pylint: disable=protected-access
+			self._positions[key] = self._initial_position(partition)
+			self._eof_reported.discard(key)
+
+	def get_watermark_offsets(self, partition: TopicPartition, timeout=None, cached=False) -> tuple:
+		# pylint: disable=unused-argument
+
+		with self._broker.condition:
+			return 0, len(self._broker.partitions(partition.topic)[partition.partition])
+
+	def offsets_for_times(self, partitions: list, timeout=None) -> list:
+		# pylint: disable=unused-argument
+		"""Returns, for each partition, the earliest offset whose timestamp is at least the
+		one given as its offset, in milliseconds, or `OFFSET_END` if there is none. """
+
+		result = []
+		with self._broker.condition:
+			for partition in partitions:
+				log = self._broker.partitions(partition.topic)[partition.partition]
+				offset = next((msg.offset() for msg in log if msg._timestamp >= partition.offset), OFFSET_END)	# pylint: disable=protected-access
+				result.append(TopicPartition(partition.topic, partition.partition, offset))
+		return result
+
+	def commit(self, message=None, offsets=None, asynchronous=True):
+		# pylint: disable=unused-argument
+
+		with self._broker.condition:
+			committed = self._broker.group(self._group_id).committed
+			if message is not None:
+				committed[(message.topic(), message.partition())] = message.offset() + 1
+			elif offsets is not None:
+				for partition in offsets:
+					committed[(partition.topic, partition.partition)] = partition.offset
+			else:
+				committed.update(self._positions)
+
+	def committed(self, partitions: list, timeout=None) -> list:
+		# pylint: disable=unused-argument
+
+		committed = self._broker.group(self._group_id).committed
+		return [
+			TopicPartition(p.topic, p.partition, committed.get((p.topic, p.partition), OFFSET_INVALID))
+			for p in partitions
+		]
+
+	def poll(self, timeout: Optional[float] = None):
+
+		msgs = self.consume(1, -1 if timeout is None else timeout)
+		return msgs[0] if msgs else None
+
+	def consume(self, num_messages: int = 1, timeout: float = -1) -> list:
+
+		self._check_open()
+		deadline = None if timeout is None or timeout < 0 else time.monotonic() + timeout
+		with self._broker.condition:
+			while True:
+				self._rebalance()
+				msgs = self._fetch(num_messages)
+				if msgs:
+					return msgs
+				remaining = None if deadline is None else deadline - time.monotonic()
+				if remaining is not None and remaining <= 0:
+					return []
+				self._broker.wait(remaining)
+
+	def close(self):
+
+		if not self._closed:
+			if self._subscribed:
+				self._broker.leave(self._group_id, self._member_id)
+			self._closed = True
+
+	def _check_open(self):
+
+		if self._closed:
+			raise RuntimeError('Consumer closed')
+
+	def _initial_position(self, partition: TopicPartition) -> int:
+
+		high = len(self._broker.partitions(partition.topic)[partition.partition])
+		offset = partition.offset
+		if offset == OFFSET_BEGINNING:
+			return 0
+		if offset == OFFSET_END:
+			return high
+		if offset >= 0:
+			return min(offset, high)
+
+		committed = self._broker.group(self._group_id).committed.get((partition.topic, partition.partition))
+		if committed is not None:
+			return committed
+		return 0 if self._auto_offset_reset in ('earliest', 'smallest', 'beginning') else high
+
+	def _rebalance(self):
+
+		if not self._subscribed:
+			return
+		group = self._broker.group(self._group_id)
+		if group.generation == self._generation:
+			return
+		self._generation = group.generation
+
+		assigned = self._broker.assignment(self._group_id, self._member_id)
+		if assigned == self._assigned:
+			return
+
+		if self._on_revoke is not None and self._assigned is not None:
+			self._on_revoke(self, [TopicPartition(topic, partition) for topic, partition in self._assigned])
+		self._assigned = assigned
+		assigned = [TopicPartition(topic, partition) for topic, partition in assigned]
+		if self._on_assign is not None:
+			self._on_assign(self, assigned)
+		else:
+			self.assign(assigned)
+
+	def _fetch(self, num_messages: int) -> list:
+
+		msgs = []
+		for key, position in self._positions.items():
+			if key in self._paused:
+				continue
+			log = self._broker.partitions(key[0])[key[1]]
+			if position < len(log):
+				batch = log[position:position + num_messages - len(msgs)]
+				msgs.extend(batch)
+				self._positions[key] = position + len(batch)
+				self._eof_reported.discard(key)
+			if self._partition_eof and self._positions[key] == len(log) and key not in self._eof_reported:
+				if len(msgs) < num_messages:
+					self._eof_reported.add(key)
+					msgs.append(MemoryMessage(key[0], key[1], len(log),
+						error=KafkaError(KafkaError._PARTITION_EOF)))	# pylint: disable=protected-access
+			if len(msgs) >= num_messages:
+				break
+		return msgs
+
+
+class MemoryProducer():
+	"""`confluent_kafka.Producer` counterpart for `MemoryBroker`.
+
+	Messages are appended to the broker immediately. Delivery callbacks are served by
+	`poll()` and `flush()`, as with librdkafka.
+
+	"""
+	def __init__(self, **config):
+
+		self._broker = MemoryBroker.get(config['bootstrap.servers'])
+		self._deliveries = []
+		self._round_robin = itertools.count()
+
+	def produce(self, topic, value=None, key=None, partition=-1, on_delivery=None, timestamp=0, headers=None, callback=None):
+		# pylint: disable=too-many-arguments
+
+		if headers is not None:
+			headers = [(name, _to_bytes(header)) for name, header in (headers.items() if isinstance(headers, dict) else headers)]
+		key = _to_bytes(key)
+		value = _to_bytes(value)
+		msg = self._broker.append(
+			topic, partition, key, value, headers, timestamp or time.time_ns() // 1_000_000, self._round_robin
+		)
+
+		on_delivery = on_delivery or callback
+		if on_delivery is not None:
+			self._deliveries.append((on_delivery, msg))
+
+	def poll(self, timeout=None) -> int:
+		# pylint: disable=unused-argument
+
+		deliveries, self._deliveries = self._deliveries, []
+		for on_delivery, msg in deliveries:
+			on_delivery(None, msg)
+		return len(deliveries)
+
+	def flush(self, timeout=None) -> int:
+
+		self.poll(timeout)
+		return 0
+
+	def __len__(self):
+
+		return len(self._deliveries)
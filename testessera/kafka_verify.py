@@ -0,0 +1,336 @@
+"""Provides a multi-process verifier of high-volume Kafka topics.
+
+`KafkaVerifier` runs the same assertion function on every message of a set of topics in
+several worker processes of one consumer group, so the assertions of each partition run
+in parallel. Pass/fail counts, the first failures and throughput are merged back into a
+`VerificationReport`:
+
+	..sourcecode ::
+
+		def check_order(msg: KafkaMessage):
+			assert_kafka_message(msg, expected_json_schema=ORDER_SCHEMA)
+
+		with KafkaVerifier(['orders'], check_order, processes=8) as verifier:
+			replay_orders()
+			report = verifier.wait(num_messages=1_000_000, timeout=300.0)
+
+		report.assert_passed()
+
+Worker processes are spawned, so the assertion function must be importable: defined at
+module level rather than a lambda or a closure.
+
+"""
+from typing import Callable, Optional
+from collections import namedtuple
+from queue import Empty
+import multiprocessing
+import logging
+import time
+import uuid
+from confluent_kafka import KafkaException
+from testessera.kafka import KafkaConsumer, KafkaMessage
+from testessera.kafka_codecs import CodecRegistry
+
+
+VerificationFailure = namedtuple('VerificationFailure', ('topic', 'partition', 'offset', 'error'))
+"""Message that failed the assertion, with the error message. """
+
+
+class VerificationReport():
+	"""Merged results of the workers of a `KafkaVerifier`.
+
+	Attributes:
+		passed (int):				Messages that passed the assertion.
+		failed (int):				Messages that failed it.
+		failures (list[VerificationFailure]):	First failures, in no particular order.
+		errors (list[str]):			Errors that stopped a worker.
+		first_time (float, optional):		Epoch seconds of the first verified message.
+		last_time (float, optional):		Epoch seconds of the last verified message.
+		workers (list[VerificationReport]):	Reports of every worker.
+
+	"""
+	def __init__(self, max_failures: int = 10):
+
+		self.passed = 0
+		self.failed = 0
+		self.failures = []
+		self.errors = []
+		self.first_time = None
+		self.last_time = None
+		self.workers = []
+		self._max_failures = max_failures
+
+	@property
+	def messages(self) -> int:
+		"""Number of verified messages. """
+
+		return self.passed + self.failed
+
+	@property
+	def elapsed(self) -> float:
+		"""Seconds from the first to the last verified message. """
+
+		return self.last_time - self.first_time if self.messages else 0.0
+
+	@property
+	def throughput(self) -> float:
+		"""Verified messages per second. """
+
+		return self.messages / self.elapsed if self.elapsed else 0.0
+
+	def record(self, msg: KafkaMessage, error: Optional[Exception] = None):
+		"""Records the result of verifying `msg`. """
+
+		now = time.time()
+		if self.first_time is None:
+			self.first_time = now
+		self.last_time = now
+
+		if error is None:
+			self.passed += 1
+			return
+		self.failed += 1
+		if len(self.failures) < self._max_failures:
+			self.failures.append(VerificationFailure(msg.topic(), msg.partition(), msg.offset(), str(error)))
+
+	def merge(self, other: 'VerificationReport'):
+		"""Adds the results of `other`, and keeps it in `workers`. """
+
+		self.passed += other.passed
+		self.failed += other.failed
+		self.failures.extend(other.failures[:self._max_failures - len(self.failures)])
+		self.errors.extend(other.errors)
+		if other.first_time is not None:
+			self.first_time = other.first_time if self.first_time is None else min(self.first_time, other.first_time)
+			self.last_time = other.last_time if self.last_time is None else max(self.last_time, other.last_time)
+		self.workers.append(other)
+
+	def assert_passed(self, min_messages: int = 1):
+		"""Asserts no message failed, no worker stopped on an error and at least
+		`min_messages` were verified.
+
+		Raises:
+			AssertionError
+
+		"""
+		assert not self.errors, f'Verifier workers failed: {self.errors}'
+		assert not self.failed, f'{self.failed} of {self.messages} Kafka messages failed. First failures: {self.failures}'
+		assert self.messages >= min_messages, f'Expected at least {min_messages} Kafka messages but got {self.messages}'
+
+	def __str__(self):
+		return (
+			f'VerificationReport(passed={self.passed}, failed={self.failed}, workers={len(self.workers)},'
+			f' throughput={self.throughput:.0f}/s)'
+		)
+
+
+class KafkaVerifier():
+	"""Verifies the messages of topics with an assertion function in worker processes.
+
+	Workers share a consumer group, so partitions are split among them, and only see
+	messages produced once `start()` returned. They commit their offsets after every
+	batch, so on a rebalance partitions resume where their previous owner stopped. The
+	assertion function gets every message as a `KafkaMessage`, and fails it by raising
+	any exception.
+
+	"""
+	def __init__(self,
+			topics: list[str],
+			assertion: Callable[[KafkaMessage], None],
+			processes: int = 4,
+			bootstrap_servers=None,
+			group_id=None,
+			config=None,
+			codecs: Optional[CodecRegistry] = None,
+			max_failures: int = 10,
+			batch_size: int = 1000):
+		# pylint: disable=too-many-arguments
+		"""
+
+		Args:
+			topics (list[str]):		Topics to verify.
+			assertion (Callable):		Module-level function called with every message.
+			processes (int):		Number of worker processes. More than the number of
+				partitions leaves workers idle.
+			codecs (CodecRegistry, optional):	Codecs of the messages. Defaults to JSON.
+			max_failures (int):		Number of failures kept in the report.
+			batch_size (int):		Maximum number of messages consumed at once.
+
+		See `KafkaConsumer` for the rest of arguments.
+
+		"""
+		self.topics = list(topics)
+		self.assertion = assertion
+		self.processes = processes
+		self._worker_args = (
+			self.topics, assertion, bootstrap_servers, group_id or f'testessera-verifier-{uuid.uuid4().hex[:8]}',
+			config, codecs, max_failures, batch_size
+		)
+		self._max_failures = max_failures
+		self._context = multiprocessing.get_context('spawn')
+		self._workers = []
+		self._results = None
+		self._stop = None
+		self._counter = None
+		self._report = None
+
+	def __enter__(self):
+
+		self.start()
+		return self
+
+	def __exit__(self, *exc_info):
+
+		self.stop()
+
+	def start(self, timeout: float = 60.0):
+		"""Starts the workers and waits until the consumer group is settled: every worker
+		was assigned its partitions and no partition is still owned by two workers.
+
+		Raises:
+			RuntimeError:	Already started, or some worker failed to subscribe.
+			TimeoutError:	The group did not settle within `timeout`.
+
+		"""
+		if self._workers:
+			raise RuntimeError('KafkaVerifier already started')
+
+		self._results = self._context.Queue()
+		self._stop = self._context.Event()
+		self._counter = self._context.Value('q', 0)
+		for index in range(self.processes):
+			worker = self._context.Process(
+				target=_verify_worker,
+				args=(index, *self._worker_args, self._results, self._stop, self._counter),
+				daemon=True
+			)
+			worker.start()
+			self._workers.append(worker)
+
+		# Workers report their assignment whenever it changes. The group is settled
+		# once every worker reported and every partition seen has exactly one owner.
+		deadline = time.monotonic() + timeout
+		assignments = {}
+		seen = set()
+		while not self._settled(assignments, seen):
+			try:
+				kind, payload = self._results.get(timeout=max(deadline - time.monotonic(), 0))
+			except Empty as e:
+				self.stop()
+				raise TimeoutError(f'Verifier consumer group not settled within {timeout} seconds') from e
+			if kind == 'error':
+				self.stop()
+				raise RuntimeError(f'Verifier worker failed: {payload}')
+			if kind == 'assigned':
+				index, partitions = payload
+				assignments[index] = partitions
+				seen.update(partitions)
+
+	def _settled(self, assignments: dict, seen: set) -> bool:
+
+		if len(assignments) < self.processes:
+			return False
+		owned = sum(len(partitions) for partitions in assignments.values())
+		return owned == len(seen) and set().union(*assignments.values()) == seen
+
+	def wait(self, num_messages: Optional[int] = None, timeout: float = 60.0, idle_timeout: float = 5.0) -> VerificationReport:
+		"""Waits until the messages are verified, and stops the workers.
+
+		Args:
+			num_messages (int, optional):	Number of messages expected.
+			timeout (float):		Maximum seconds to wait.
+			idle_timeout (float):		Seconds without new messages after which the
+				verification is over.
+
+		Returns:
+			VerificationReport:	Merged report of all the workers.
+
+		"""
+		deadline = time.monotonic() + timeout
+		last_count, last_change = 0, time.monotonic()
+		while True:
+			now = time.monotonic()
+			count = self._counter.value
+			if count != last_count:
+				last_count, last_change = count, now
+			if num_messages is not None and count >= num_messages:
+				break
+			if now >= deadline or now - last_change >= idle_timeout:
+				break
+			time.sleep(0.05)
+
+		return self.stop()
+
+	def stop(self, timeout: float = 30.0) -> VerificationReport:
+		"""Stops the workers and returns their merged report. """
+
+		if self._report is not None or not self._workers:
+			return self._report
+
+		self._stop.set()
+		report = VerificationReport(self._max_failures)
+		deadline = time.monotonic() + timeout
+		reported = 0
+		while reported < len(self._workers):
+			try:
+				kind, payload = self._results.get(timeout=max(deadline - time.monotonic(), 0))
+			except Empty:
+				report.errors.append(f'{len(self._workers) - reported} verifier workers did not report')
+				break
+			if kind == 'report':
+				report.merge(payload)
+				reported += 1
+			elif kind == 'error':
+				report.errors.append(payload)
+
+		for worker in self._workers:
+			worker.join(max(deadline - time.monotonic(), 0.1))
+			if worker.is_alive():
+				worker.terminate()
+
+		self._report = report
+		logging.debug('Kafka verification %s', report)
+		return report
+
+
+def _verify_worker(
+		index, topics, assertion, bootstrap_servers, group_id, config, codecs, max_failures, batch_size,
+		results, stop, counter):
+	# pylint: disable=too-many-arguments,broad-exception-caught
+
+	report = VerificationReport(max_failures)
+	try:
+		consumer = KafkaConsumer(topics, bootstrap_servers, group_id, config, codecs=codecs)
+	except (KafkaException, TimeoutError) as e:
+		results.put(('error', str(e)))
+		results.put(('report', report))
+		return
+
+	assignment = None
+	try:
+		while not stop.is_set():
+			current = frozenset((p.topic, p.partition) for p in consumer.consumer.assignment())
+			if current != assignment:
+				assignment = current
+				results.put(('assigned', (index, assignment)))
+
+			msgs = consumer.consume_many(batch_size, timeout=0.1)
+			for msg in msgs:
+				if not isinstance(msg, KafkaMessage):
+					msg = KafkaMessage(msg)
+				try:
+					assertion(msg)
+				except Exception as e:
+					report.record(msg, e)
+				else:
+					report.record(msg)
+			if msgs:
+				# Committed offsets are where another worker resumes if this one stops
+				consumer.consumer.commit(asynchronous=True)
+				with counter.get_lock():
+					counter.value += len(msgs)
+	except KafkaException as e:
+		report.errors.append(str(e))
+	finally:
+		consumer.close()
+		results.put(('report', report))
@@ -0,0 +1,170 @@
+"""Provides an open-loop load runner for `RestClient`.
+
+"""
+from typing import Callable, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from testessera.rest import RestClient, RestRequest, assert_rest_response
+from testessera.histogram import LatencyHistogram
+
+
+class LoadReport():
+	"""Results of `run_load()`.
+
+	Attributes:
+		target_rps (float):			Requested arrival rate.
+		duration (float):			Wall-clock seconds from the first scheduled
+			request to the last completed one.
+		latency (LatencyHistogram):		Latencies measured from the scheduled start
+			time of every request, so queueing delays are included.
+		status_codes (Counter):			Number of responses per status code.
+		exceptions (Counter):			Number of requests that raised, per exception
+			type name.
+		assertion_failures (int):		Number of responses that failed
+			`assert_rest_response()`.
+		first_assertion_errors (list[str]):	First assertion error messages.
+
+	"""
+	def __init__(self, target_rps: float):
+
+		self.target_rps = target_rps
+		self.duration = 0.0
+		self.latency = LatencyHistogram()
+		self.status_codes = Counter()
+		self.exceptions = Counter()
+		self.assertion_failures = 0
+		self.first_assertion_errors = []
+
+	@property
+	def requests(self) -> int:
+		"""Number of issued requests. """
+
+		return sum(self.status_codes.values()) + sum(self.exceptions.values())
+
+	@property
+	def achieved_rps(self) -> float:
+		"""Completed requests per second. """
+
+		return self.requests / self.duration if self.duration else 0.0
+
+	@property
+	def status_code_rates(self) -> dict:
+		"""Fraction of requests per status code. """
+
+		total = self.requests
+		return {status_code: count / total for status_code, count in self.status_codes.items()} if total else {}
+
+	@property
+	def error_rate(self) -> float:
+		"""Fraction of requests that raised or got a non-2XX status. """
+
+		total = self.requests
+		if not total:
+			return 0.0
+		non_2xx = sum(count for status_code, count in self.status_codes.items() if status_code // 100 != 2)
+		return (sum(self.exceptions.values()) + non_2xx) / total
+
+	@property
+	def assertion_failure_rate(self) -> float:
+		"""Fraction of requests whose response failed `assert_rest_response()`. """
+
+		total = self.requests
+		return self.assertion_failures / total if total else 0.0
+
+	def __str__(self):
+		return (
+			f'LoadReport(target_rps={self.target_rps}, achieved_rps={self.achieved_rps:.1f},'
+			f' requests={self.requests}, error_rate={self.error_rate:.2%},'
+			f' status_codes={dict(self.status_codes)}, exceptions={dict(self.exceptions)},'
+			f' assertion_failures={self.assertion_failures}, latency={self.latency})'
+		)
+
+
+def run_load(
+		client: RestClient,
+		request_factory: Callable[[], RestRequest],
+		rps: float,
+		duration: float,
+		max_workers: int = 64,
+		assert_kwargs: Optional[dict] = None,
+		max_assertion_errors: int = 10) -> LoadReport:
+	# pylint: disable=too-many-arguments disable=too-many-locals
+	"""Issues requests built by `request_factory` at a fixed arrival rate.
+
+	Scheduling is open-loop: request `i` is scheduled at `i / rps` seconds regardless of
+	how long previous requests take, and its latency is measured from that scheduled time.
+	This way a slow service shows up as higher latencies rather than as fewer samples
+	(coordinated omission).
+
+	Args:
+		client (RestClient):			Client used to issue the requests.
+		request_factory (Callable):		Returns the `RestRequest` to issue on each call.
+		rps (float):				Target requests per second.
+		duration (float):			Seconds of load. `int(rps * duration)` requests are
+			issued.
+		max_workers (int):			Maximum number of concurrent requests.
+		assert_kwargs (dict, optional):		If provided, every response is checked with
+			`assert_rest_response(response, **assert_kwargs)`.
+		max_assertion_errors (int):		Number of assertion error messages kept in
+			the report.
+
+	Returns:
+		LoadReport:	Throughput, latency and error statistics.
+
+	Example:
+
+		..sourcecode ::
+
+			report = run_load(client, lambda: BreedGet('abys'), rps=200, duration=30,
+				assert_kwargs={'status_code': 200})
+
+			assert report.latency.percentile(99) < 0.250, report
+
+	"""
+	report = LoadReport(rps)
+	lock = threading.Lock()
+	client._ensure_pool_size(max_workers)	# pylint: disable=protected-access
+
+	def issue(rest_request: RestRequest, scheduled: float):
+
+		try:
+			response = client.request(rest_request)
+		except Exception as e:	# pylint: disable=broad-exception-caught
+			report.latency.record(time.perf_counter() - scheduled)
+			with lock:
+				report.exceptions[type(e).__name__] += 1
+			return
+
+		report.latency.record(time.perf_counter() - scheduled)
+
+		assertion_error = None
+		if assert_kwargs is not None:
+			try:
+				assert_rest_response(response, **assert_kwargs)
+			except AssertionError as e:
+				assertion_error = e
+
+		with lock:
+			report.status_codes[response.status_code] += 1
+			if assertion_error is not None:
+				report.assertion_failures += 1
+				if len(report.first_assertion_errors) < max_assertion_errors:
+					report.first_assertion_errors.append(str(assertion_error))
+
+	num_requests = int(rps * duration)
+	interval = 1.0 / rps
+
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		start = time.perf_counter()
+		for i in range(num_requests):
+			scheduled = start + i * interval
+			delay = scheduled - time.perf_counter()
+			if delay > 0:
+				time.sleep(delay)
+			executor.submit(issue, request_factory(), scheduled)
+
+	report.duration = time.perf_counter() - start
+
+	return report
@@ -0,0 +1,300 @@
+"""Provides precompiled matchers of partial JSON documents.
+
+A `JsonMatcher` is built once from the expected part of a document and compiled into a
+flat list of path checks, so matching thousands of instances only walks the expected
+paths. Fields not in the expected document are ignored. Values can be patterns:
+
+- `ANY`:			The field exists, with any value.
+- `Regex(pattern)`:		A string fully matching `pattern`.
+- `Approx(value, ...)`:		A number within a tolerance of `value`.
+- `Unordered(items)`:		An array whose items match `items` in any order.
+
+	..sourcecode ::
+
+		order_matcher = JsonMatcher({
+			'id': ANY,
+			'status': 'CREATED',
+			'reference': Regex(r'ORD-[0-9]{8}'),
+			'total': Approx(99.9, abs_tol=0.01),
+			'lines': Unordered([{'sku': 'A1'}, {'sku': 'B2'}])
+		})
+
+		for response in responses:
+			order_matcher.assert_match(response.json())
+
+Matchers can also be the expected instance of `assert_json()`, `assert_rest_response()`
+and `assert_kafka_message()`.
+
+"""
+from typing import Iterable, Optional
+import math
+import re
+
+
+_MAX_REPR = 80
+
+
+def _short(value) -> str:
+
+	text = repr(value)
+	return text if len(text) <= _MAX_REPR else text[:_MAX_REPR - 3] + '...'
+
+
+def _format_path(path: tuple) -> str:
+
+	return '.'.join(str(field) for field in path) or '$'
+
+
+class JsonPattern():
+	"""Base pattern of expected values.
+
+	Patterns compare equal to the values they match, so they can also be used in
+	expected instances compared with `==`.
+
+	"""
+	def check(self, value) -> Optional[str]:
+		"""Returns None if `value` matches, or the reason why it does not. """
+
+		raise NotImplementedError
+
+	def __eq__(self, other):
+
+		return self.check(other) is None
+
+	__hash__ = None
+
+
+class _Any(JsonPattern):
+
+	def check(self, value) -> Optional[str]:
+
+		return None
+
+	def __repr__(self):
+		return 'ANY'
+
+
+ANY = _Any()
+"""JsonPattern: Matches any value. The field must exist. """
+
+
+class Regex(JsonPattern):
+	"""Matches strings that fully match `pattern`. """
+
+	def __init__(self, pattern: str, flags: int = 0):
+
+		self.pattern = re.compile(pattern, flags)
+
+	def check(self, value) -> Optional[str]:
+
+		if isinstance(value, str) and self.pattern.fullmatch(value):
+			return None
+		return f'expected a string matching {self.pattern.pattern!r} but got {_short(value)}'
+
+	def __repr__(self):
+		return f'Regex({self.pattern.pattern!r})'
+
+
+class Approx(JsonPattern):
+	"""Matches numbers close to `value`, as `math.isclose()`. """
+
+	def __init__(self, value: float, rel_tol: float = 1e-9, abs_tol: float = 0.0):
+
+		self.value = value
+		self.rel_tol = rel_tol
+		self.abs_tol = abs_tol
+
+	def check(self, value) -> Optional[str]:
+
+		if isinstance(value, (int, float)) and not isinstance(value, bool)	\
+				and math.isclose(value, self.value, rel_tol=self.rel_tol, abs_tol=self.abs_tol):
+			return None
+		return f'expected {self!r} but got {_short(value)}'
+
+	def __repr__(self):
+		return f'Approx({self.value}, rel_tol={self.rel_tol}, abs_tol={self.abs_tol})'
+
+
+class Unordered(JsonPattern):
+	"""Matches arrays whose items match `items` in any order, one item each.
+
+	Items are partial documents, compiled into `JsonMatcher`. If `subset` is True the
+	array may have more items.
+
+	"""
+	def __init__(self, items: Iterable, subset: bool = False):
+
+		self.items = list(items)
+		self.subset = subset
+		self._matchers = [JsonMatcher(item) for item in self.items]
+
+	def check(self, value) -> Optional[str]:
+
+		if not isinstance(value, list):
+			return f'expected an array but got {_short(value)}'
+		if len(value) < len(self.items) or (not self.subset and len(value) != len(self.items)):
+			return f'expected {len(self.items)} items but got {len(value)}'
+
+		candidates = [
+			[index for index, item in enumerate(value) if matcher.matches(item)]
+			for matcher in self._matchers
+		]
+		# Bipartite matching with augmenting paths, as an item may match several patterns
+		matched_by = {}
+
+		def assign(expected: int, visited: set) -> bool:
+			for index in candidates[expected]:
+				if index in visited:
+					continue
+				visited.add(index)
+				if index not in matched_by or assign(matched_by[index], visited):
+					matched_by[index] = expected
+					return True
+			return False
+
+		for expected in range(len(self.items)):
+			if not assign(expected, set()):
+				return f'has no match for expected item {_short(self.items[expected])}'
+		return None
+
+	def __repr__(self):
+		return f'Unordered({_short(self.items)}, subset={self.subset})'
+
+
+def _equal(expected):
+
+	# bool is an int in Python but not in JSON
+	expected_bool = isinstance(expected, bool)
+
+	def check(value) -> Optional[str]:
+		if value == expected and isinstance(value, bool) == expected_bool:
+			return None
+		return f'expected {_short(expected)} but got {_short(value)}'
+
+	return check
+
+
+def _is_object(value) -> Optional[str]:
+
+	return None if isinstance(value, dict) else f'expected an object but got {_short(value)}'
+
+
+def _has_length(length: int):
+
+	def check(value) -> Optional[str]:
+		if not isinstance(value, list):
+			return f'expected an array but got {_short(value)}'
+		if len(value) != length:
+			return f'expected {length} items but got {len(value)}'
+		return None
+
+	return check
+
+
+class JsonMatcher():
+	"""Matcher of a partial JSON document.
+
+	Objects match if they have the expected fields, arrays if they have the same length
+	and matching items, and other values if they are equal or match a `JsonPattern`.
+	Checks run in document order and the descendants of a failed object or array are
+	skipped, so only the first failure of each branch is reported.
+
+	Attributes:
+		expected:	Expected document.
+
+	"""
+	def __init__(self, expected):
+
+		self.expected = expected
+		# (path, check, index of the first check outside its subtree)
+		self._checks = []
+		self._compile(expected, ())
+		self._checks = [tuple(check) for check in self._checks]
+
+	def __reduce__(self):
+
+		# Checks are closures, so matchers are pickled as their expected document
+		return (JsonMatcher, (self.expected,))
+
+	def _compile(self, expected, path: tuple):
+
+		index = len(self._checks)
+		if isinstance(expected, JsonPattern):
+			self._checks.append([path, expected.check, index + 1])
+		elif isinstance(expected, dict):
+			self._checks.append([path, _is_object, None])
+			for key, value in expected.items():
+				self._compile(value, path + (key,))
+			self._checks[index][2] = len(self._checks)
+		elif isinstance(expected, (list, tuple)):
+			self._checks.append([path, _has_length(len(expected)), None])
+			for item_index, item in enumerate(expected):
+				self._compile(item, path + (item_index,))
+			self._checks[index][2] = len(self._checks)
+		else:
+			self._checks.append([path, _equal(expected), index + 1])
+
+	def match(self, instance, max_failures: int = 1) -> list[str]:
+		"""Returns up to `max_failures` failure messages, empty if `instance` matches. """
+
+		failures = []
+		checks = self._checks
+		index = 0
+		while index < len(checks):
+			path, check, skip = checks[index]
+			value = instance
+			try:
+				for field in path:
+					value = value[field]
+			except (KeyError, IndexError, TypeError):
+				error = 'is missing'
+			else:
+				error = check(value)
+
+			if error is None:
+				index += 1
+				continue
+			failures.append(f'`{_format_path(path)}` {error}')
+			if len(failures) >= max_failures:
+				break
+			index = skip
+		return failures
+
+	def matches(self, instance) -> bool:
+		"""Returns True if `instance` matches, stopping at the first failed check. """
+
+		return not self.match(instance)
+
+	def assert_match(self, instance, max_failures: int = 5):
+		"""Asserts `instance` matches.
+
+		Raises:
+			AssertionError:	With up to `max_failures` failures.
+
+		"""
+		failures = self.match(instance, max_failures)
+		assert not failures, f'JSON instance does not match the expected document: {"; ".join(failures)}'
+
+	def assert_all(self, instances: Iterable, max_failures: int = 10) -> int:
+		"""Asserts every instance matches.
+
+		Returns:
+			int:	Number of instances matched.
+
+		Raises:
+			AssertionError:	With up to `max_failures` failures, prefixed by the index of
+				their instance. Matching stops once they are found.
+
+		"""
+		failures = []
+		count = 0
+		for index, instance in enumerate(instances):
+			count += 1
+			failures.extend(f'[{index}] {failure}' for failure in self.match(instance, max_failures - len(failures)))
+			if len(failures) >= max_failures:
+				break
+		assert not failures, f'JSON instances do not match the expected document: {"; ".join(failures)}'
+		return count
+
+	def __repr__(self):
+		return f'JsonMatcher({_short(self.expected)})'
@@ -0,0 +1,147 @@
+"""Provides an in-process metrics registry.
+
+Metrics are identified by a name and a set of labels. Counters and histograms are created
+on first use and can be dumped as JSON or Prometheus text, e.g. at the end of a test
+session. Clients record metrics only if they are given a registry:
+
+	..sourcecode ::
+
+		client = RestClient(BASE_URL, metrics=default_registry)
+
+		def pytest_sessionfinish(session):
+			with open('metrics.prom', 'w') as f:
+				f.write(default_registry.to_prometheus())
+
+"""
+from typing import Optional
+import threading
+import json
+from testessera.histogram import LatencyHistogram
+
+
+_QUANTILES = (('0.5', 50), ('0.9', 90), ('0.99', 99), ('0.999', 99.9))
+
+
+class MetricsCounter():
+	"""Monotonic counter. """
+
+	def __init__(self):
+
+		self._value = 0
+		self._lock = threading.Lock()
+
+	def inc(self, amount: float = 1):
+		"""Increments the counter by `amount`. """
+
+		with self._lock:
+			self._value += amount
+
+	@property
+	def value(self) -> float:
+		"""Current value. """
+
+		return self._value
+
+
+class MetricsRegistry():
+	"""Registry of counters and latency histograms. """
+
+	def __init__(self):
+
+		self._counters = {}
+		self._histograms = {}
+		self._lock = threading.Lock()
+
+	def counter(self, name: str, **labels) -> MetricsCounter:
+		"""Returns the counter `name` with `labels`, creating it if needed. """
+
+		key = (name, tuple(sorted(labels.items())))
+		counter = self._counters.get(key)
+		if counter is None:
+			with self._lock:
+				counter = self._counters.setdefault(key, MetricsCounter())
+		return counter
+
+	def histogram(self, name: str, **labels) -> LatencyHistogram:
+		"""Returns the latency histogram `name` with `labels`, creating it if needed. """
+
+		key = (name, tuple(sorted(labels.items())))
+		histogram = self._histograms.get(key)
+		if histogram is None:
+			with self._lock:
+				histogram = self._histograms.setdefault(key, LatencyHistogram())
+		return histogram
+
+	def clear(self):
+		"""Removes all metrics. """
+
+		with self._lock:
+			self._counters.clear()
+			self._histograms.clear()
+
+	def to_dict(self) -> dict:
+		"""Returns all metrics as a dict of lists of `{'labels': ..., ...}` samples. """
+
+		metrics = {}
+		with self._lock:
+			counters = list(self._counters.items())
+			histograms = list(self._histograms.items())
+
+		for (name, labels), counter in counters:
+			metrics.setdefault(name, []).append({'labels': dict(labels), 'value': counter.value})
+		for (name, labels), histogram in histograms:
+			metrics.setdefault(name, []).append({'labels': dict(labels), **histogram.summary()})
+
+		return metrics
+
+	def to_json(self, indent: Optional[int] = None) -> str:
+		"""Returns all metrics as JSON. See `to_dict()`. """
+
+		return json.dumps(self.to_dict(), indent=indent)
+
+	def to_prometheus(self) -> str:
+		"""Returns all metrics in Prometheus text exposition format.
+
+		Counters are exported as `counter` and histograms as `summary` with 0.5, 0.9,
+		0.99 and 0.999 quantiles, in seconds.
+
+		"""
+		lines = []
+		with self._lock:
+			counters = sorted(self._counters.items(), key=lambda item: item[0])
+			histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+
+		last_name = None
+		for (name, labels), counter in counters:
+			if name != last_name:
+				lines.append(f'# TYPE {name} counter')
+				last_name = name
+			lines.append(f'{name}{_format_labels(labels)} {counter.value}')
+
+		last_name = None
+		for (name, labels), histogram in histograms:
+			if name != last_name:
+				lines.append(f'# TYPE {name} summary')
+				last_name = name
+			for quantile, percentile in _QUANTILES:
+				quantile_labels = labels + (('quantile', quantile),)
+				lines.append(f'{name}{_format_labels(quantile_labels)} {histogram.percentile(percentile)}')
+			lines.append(f'{name}_sum{_format_labels(labels)} {histogram.mean * histogram.count}')
+			lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+
+		return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: tuple) -> str:
+
+	if not labels:
+		return ''
+	escaped = (
+		f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+		for name, value in labels
+	)
+	return '{' + ','.join(escaped) + '}'
+
+
+default_registry = MetricsRegistry()
+"""MetricsRegistry: Process-wide registry for clients that opt in with `metrics=default_registry`. """
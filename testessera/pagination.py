@@ -0,0 +1,107 @@
+"""Provides pagination strategies for `RestClient.paginate()`.
+
+A strategy extracts the items of a page and computes the URL of the next page. URLs of
+pages that are built from query parameters are obtained with `url_for(query_params)`,
+which merges `query_params` into those of the paginated `RestRequest`.
+
+"""
+from typing import Callable, Optional
+from urllib.parse import urljoin
+import requests
+from testessera.json import get_json_path
+
+
+UrlFor = Callable[[dict], str]
+
+
+class Pagination():
+	"""Base pagination strategy.
+
+	Attributes:
+		items_field (str, optional):	Dotted path of the items array in the response
+			body. E.g. `data.items`. If None, the body itself is the items array.
+
+	"""
+	def __init__(self, items_field: Optional[str] = None):
+
+		self.items_field = items_field
+
+	def first_url(self, url_for: UrlFor) -> str:
+		"""Returns the URL of the first page. """
+
+		return url_for({})
+
+	def items(self, response: requests.Response) -> list:
+		"""Returns the items of a page. """
+
+		body = response.json()
+		return get_json_path(body, self.items_field) if self.items_field else body
+
+	def next_url(self, response: requests.Response, items: list, items_seen: int, url_for: UrlFor) -> Optional[str]:
+		"""Returns the URL of the page after `response`, or None if it is the last one.
+
+		Args:
+			response (requests.Response):	Current page.
+			items (list):			Items of the current page.
+			items_seen (int):		Number of items of all the pages up to the current one.
+			url_for (UrlFor):		Builds a page URL from query parameters.
+
+		"""
+		raise NotImplementedError
+
+
+class LinkHeaderPagination(Pagination):
+	"""Follows the `next` relation of the RFC8288 `Link` response header. """
+
+	def next_url(self, response: requests.Response, items: list, items_seen: int, url_for: UrlFor) -> Optional[str]:
+
+		link = response.links.get('next')
+		return urljoin(response.url, link['url']) if link else None
+
+
+class CursorPagination(Pagination):
+	"""Passes the cursor found in each page as a query parameter of the next one.
+
+	Attributes:
+		cursor_field (str):	Dotted path of the next page cursor in the response body.
+			Pagination stops when it is missing, null or empty.
+		cursor_param (str):	Query parameter the cursor is passed in.
+
+	"""
+	def __init__(self, cursor_field: str = 'next_cursor', cursor_param: str = 'cursor', items_field: Optional[str] = 'items'):
+
+		super().__init__(items_field)
+		self.cursor_field = cursor_field
+		self.cursor_param = cursor_param
+
+	def next_url(self, response: requests.Response, items: list, items_seen: int, url_for: UrlFor) -> Optional[str]:
+
+		try:
+			cursor = get_json_path(response.json(), self.cursor_field)
+		except (KeyError, IndexError, ValueError, TypeError):
+			return None
+		return url_for({self.cursor_param: cursor}) if cursor else None
+
+
+class OffsetPagination(Pagination):
+	"""Requests pages of `limit` items by increasing the offset query parameter.
+
+	Pagination stops at the first page with less than `limit` items.
+
+	"""
+	def __init__(self, limit: int = 100, offset_param: str = 'offset', limit_param: str = 'limit', items_field: Optional[str] = None):
+
+		super().__init__(items_field)
+		self.limit = limit
+		self.offset_param = offset_param
+		self.limit_param = limit_param
+
+	def first_url(self, url_for: UrlFor) -> str:
+
+		return url_for({self.offset_param: 0, self.limit_param: self.limit})
+
+	def next_url(self, response: requests.Response, items: list, items_seen: int, url_for: UrlFor) -> Optional[str]:
+
+		if len(items) < self.limit:
+			return None
+		return url_for({self.offset_param: items_seen, self.limit_param: self.limit})
@@ -1,7 +1,22 @@
-from typing import Optional
+from typing import Iterable, Iterator, Optional
+from collections import deque
+from queue import Queue, Full
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import quote, urlencode, urlsplit
+import threading
+import random
 import re
+import time
+import json
 import requests
-from testessera.json import assert_json
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import jsonschema
+from testessera.json import assert_json, iter_json_array, schema_validator_cache
+from testessera.cassette import Cassette, RECORD, REPLAY
+from testessera.metrics import MetricsRegistry
+from testessera.pagination import Pagination, LinkHeaderPagination
 
 
 SUCCESS_2XX = 0
@@ -10,8 +25,17 @@ SUCCESS_2XX = 0
 
 class RestRequest():
 
-	def __init__(self, method: str, path: str, body=None, headers=None, query_params=None):
+	def __init__(self, method: str, path: str, body=None, headers=None, query_params=None,
+			path_template=None):
+		# pylint: disable=too-many-arguments
+		"""
+
+		Args:
+			path_template (str, optional):	Path with placeholders instead of identifiers.
+				E.g. `/breeds/{breed_id}`. Used to label request metrics. Defaults to
+				`path`.
 
+		"""
 		if headers is None:
 			headers = {}
 		if query_params is None:
@@ -21,6 +45,7 @@ class RestRequest():
 		self._body = body
 		self._headers = headers
 		self._query_params = query_params
+		self._path_template = path_template
 
 	@property
 	def method(self):
@@ -33,6 +58,12 @@ class RestRequest():
 
 		return self._path
 
+	@property
+	def path_template(self):
+		"""Request URL path with placeholders instead of identifiers. """
+
+		return self._path_template or self._path
+
 	@property
 	def headers(self) -> dict:
 
@@ -53,6 +84,158 @@ class RestRequest():
 		return f'RestRequest({self.method}, {self.path}, {self.headers}, {self._body})'
 
 
+_connect_timing = threading.local()
+"""Seconds spent opening connections during the current request, per thread. """
+
+
+class _TimedHTTPConnection(HTTPConnection):
+
+	def connect(self):
+
+		start = time.perf_counter()
+		super().connect()
+		_connect_timing.seconds = getattr(_connect_timing, 'seconds', 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+
+	def connect(self):
+
+		start = time.perf_counter()
+		super().connect()
+		_connect_timing.seconds = getattr(_connect_timing, 'seconds', 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+
+	ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+
+	ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+	"""`HTTPAdapter` whose connections record the time spent connecting. """
+
+	def init_poolmanager(self, *args, **kwargs):
+
+		super().init_poolmanager(*args, **kwargs)
+		self.poolmanager.pool_classes_by_scheme = {
+			'http': _TimedHTTPConnectionPool,
+			'https': _TimedHTTPSConnectionPool
+		}
+
+
+class RestResult():
+	"""Outcome of a single request issued by `RestClient.request_many()`.
+
+	Attributes:
+		index (int):				Position of the request in the input batch.
+		rest_request (RestRequest):		Issued request.
+		response (requests.Response, optional):	Response, or None if the request failed.
+		exception (Exception, optional):	Exception raised by the request, if any.
+		elapsed (float):			Wall-clock seconds spent on the request.
+
+	"""
+	def __init__(self, index: int, rest_request: RestRequest,
+			response: Optional[requests.Response] = None,
+			exception: Optional[Exception] = None,
+			elapsed: float = 0.0):
+		# pylint: disable=too-many-arguments
+
+		self.index = index
+		self.rest_request = rest_request
+		self.response = response
+		self.exception = exception
+		self.elapsed = elapsed
+
+	@property
+	def ok(self) -> bool:
+		"""True if the request completed without raising. The status code is not checked. """
+
+		return self.exception is None
+
+	def __str__(self):
+		return f'RestResult({self.index}, {self.rest_request}, {self.response}, {self.exception}, {self.elapsed:.3f}s)'
+
+
+class RestRequestTemplate():
+	"""Pre-built request issued repeatedly through a `RestClient`.
+
+	Created with `RestClient.template()`. Headers (including the API key), the encoded
+	query string, the URL and the static JSON body are resolved once. Each call only
+	substitutes the path parameters and, if provided, re-encodes the body with the
+	given fields.
+
+	Example:
+
+		..sourcecode ::
+
+			breed_get = client.template(RestRequest('GET', '/breeds/{breed_id}'))
+
+			response = breed_get.request(breed_id='abys')
+
+	"""
+	def __init__(self, client: 'RestClient', rest_request: RestRequest):
+
+		self._client = client
+		self._rest_request = rest_request
+		self._url = client._build_url(rest_request.path, rest_request.query_params)	# pylint: disable=protected-access
+		self._has_path_params = '{' in rest_request.path
+
+		headers = dict(rest_request.headers)
+		if client._api_key:	# pylint: disable=protected-access
+			headers['X-API-Key'] = client._api_key	# pylint: disable=protected-access
+		# Placeholders are substituted at every call, so the URL is only prepared if static
+		url = client._base_url if self._has_path_params else self._url	# pylint: disable=protected-access
+		self._prepared_request = requests.Request(
+			rest_request.method, url, headers, json=rest_request.body
+		).prepare()
+
+	@property
+	def rest_request(self) -> RestRequest:
+		"""Request the template was created from. Its path is the path template. """
+
+		return self._rest_request
+
+	def prepare(self, body_fields: Optional[dict] = None, **path_params) -> requests.PreparedRequest:
+		"""Returns a `requests.PreparedRequest` with `path_params` and `body_fields` applied.
+
+		Args:
+			body_fields (dict, optional):	Fields merged into a copy of the static body.
+			**path_params:			Values of the path placeholders. They are
+				percent-encoded.
+
+		"""
+		prepared_request = self._prepared_request.copy()
+		if self._has_path_params:
+			prepared_request.url = self._url.format(
+				**{name: quote(str(value), safe='') for name, value in path_params.items()}
+			)
+		if body_fields:
+			body = dict(self._rest_request.body or {})
+			body.update(body_fields)
+			prepared_request.body = json.dumps(body, allow_nan=False).encode('utf-8')
+			prepared_request.headers['Content-Type'] = 'application/json'
+			prepared_request.headers['Content-Length'] = str(len(prepared_request.body))
+
+		return prepared_request
+
+	def request(self, body_fields: Optional[dict] = None, **path_params) -> requests.Response:
+		"""Issues the request with `path_params` and `body_fields` applied.
+
+		Raises:
+			requests.RequestException
+
+		"""
+		return self._client._send(	# pylint: disable=protected-access
+			self.prepare(body_fields, **path_params),
+			path_template=self._rest_request.path_template
+		)
+
+
 class RestClient():
 	"""
 
@@ -62,33 +245,220 @@ class RestClient():
 		_timeout (float):		Timeout passed into `requests` module at every request.
 		_verify (bool):
 		_session (requests.Session):	Underlaying `requests.Session`.
+		cassette (Cassette, optional):	If set, responses are recorded into it or
+			replayed from it, depending on its mode.
+		metrics (MetricsRegistry, optional):	If set, the connect (only when a new
+			connection is opened), time-to-first-byte, body transfer and total time of
+			every request are recorded into it, labeled by method and
+			`RestRequest.path_template`. Opt-in, e.g. with `metrics.default_registry`.
+			Paths without a template are labeled as they are, so only enable it for
+			requests with templates or a bounded set of paths.
 
 	"""
-	def __init__(self, base_url: str, api_key=None, timeout: int = 60, verify=None):
+	def __init__(self, base_url: str, api_key=None, timeout: int = 60, verify=None,
+			cassette: Optional[Cassette] = None,
+			metrics: Optional[MetricsRegistry] = None):
+		# pylint: disable=too-many-arguments
 
 		self._base_url = base_url
 		self._api_key = api_key
 		self._timeout = timeout
 		self._verify = verify
+		self.cassette = cassette
+		self.metrics = metrics
 
 		self._session = requests.Session()
+		self._session.mount('https://', _TimedHTTPAdapter())
+		self._session.mount('http://', _TimedHTTPAdapter())
+		self._pool_maxsize = DEFAULT_POOLSIZE
 
 
-	def request(self, rest_request: RestRequest) -> requests.Response:
+	def request(self, rest_request: RestRequest, stream: bool = False) -> requests.Response:
 		"""
 
 		The request URL is composed by combining the `_base_url` attribute with
 		`RestRequest.path` and `RestRequest.query_params`.
 
+		Args:
+			stream (bool):	If True, the response body is not downloaded until it is
+				accessed. See `assert_rest_response_stream()`.
+
 		Raises:
 			requests.RequestException
 
-		Note:
-			* Consider using Request params instead of _build_url()
-
 		"""
 		url = self._build_url(rest_request.path, rest_request.query_params)
-		return self._request(rest_request.method, url, rest_request.headers, rest_request.body)
+		return self._request(rest_request.method, url, rest_request.headers, rest_request.body, stream,
+			rest_request.path_template)
+
+
+	def request_many(self,
+			rest_requests: Iterable[RestRequest],
+			max_workers: int = 8,
+			ordered: bool = True) -> Iterator[RestResult]:
+		"""Issues `rest_requests` concurrently over a bounded thread pool.
+
+		All workers share the session connection pool, which is enlarged to
+		`max_workers` connections per host if needed. At most `2 * max_workers` requests
+		are in flight, so `rest_requests` can be a long-running generator.
+
+		A failing request does not cancel the batch; its exception is returned in the
+		corresponding `RestResult`.
+
+		Args:
+			rest_requests (Iterable[RestRequest]):	Requests to issue.
+			max_workers (int):			Number of worker threads.
+			ordered (bool):				If True, results are yielded in input order.
+				Otherwise, they are yielded as they complete.
+
+		Yields:
+			RestResult:	One result per request.
+
+		Example:
+
+			..sourcecode ::
+
+				for result in client.request_many(BreedGet(breed_id) for breed_id in breed_ids):
+					assert result.ok, result.exception
+					assert_rest_response(result.response, 200)
+
+		"""
+		self._ensure_pool_size(max_workers)
+
+		with ThreadPoolExecutor(max_workers=max_workers) as executor:
+			pending = deque() if ordered else set()
+			for index, rest_request in enumerate(rest_requests):
+				if len(pending) >= 2 * max_workers:
+					yield from self._collect(pending, ordered)
+				future = executor.submit(self._timed_request, index, rest_request)
+				if ordered:
+					pending.append(future)
+				else:
+					pending.add(future)
+
+			while pending:
+				yield from self._collect(pending, ordered)
+
+
+	@staticmethod
+	def _collect(pending, ordered: bool) -> Iterator[RestResult]:
+
+		if ordered:
+			yield pending.popleft().result()
+		else:
+			done, _ = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				pending.remove(future)
+				yield future.result()
+
+
+	def _timed_request(self, index: int, rest_request: RestRequest) -> RestResult:
+
+		start = time.perf_counter()
+		try:
+			response = self.request(rest_request)
+		except Exception as e:	# pylint: disable=broad-exception-caught
+			return RestResult(index, rest_request, exception=e, elapsed=time.perf_counter() - start)
+
+		return RestResult(index, rest_request, response, elapsed=time.perf_counter() - start)
+
+
+	def _ensure_pool_size(self, pool_maxsize: int):
+
+		if pool_maxsize > self._pool_maxsize:
+			adapter = _TimedHTTPAdapter(pool_maxsize=pool_maxsize)
+			self._session.mount('https://', adapter)
+			self._session.mount('http://', adapter)
+			self._pool_maxsize = pool_maxsize
+
+
+	def paginate(self,
+			rest_request: RestRequest,
+			strategy: Optional[Pagination] = None,
+			prefetch: int = 1,
+			max_pages: Optional[int] = None) -> Iterator:
+		"""Yields the items of every page of a paginated listing.
+
+		Pages are fetched by a background thread while the items of the previous pages
+		are consumed. At most `prefetch` pages are buffered ahead of the one being
+		consumed, so memory stays bounded.
+
+		Args:
+			rest_request (RestRequest):		Request of the first page.
+			strategy (Pagination, optional):	`LinkHeaderPagination` (default),
+				`CursorPagination` or `OffsetPagination`.
+			prefetch (int):				Maximum number of pages fetched ahead. At
+				least 1.
+			max_pages (int, optional):		Maximum number of pages fetched.
+
+		Yields:
+			Items of the pages, in order.
+
+		Raises:
+			ValueError:			`prefetch` is less than 1.
+			requests.RequestException:	A page request failed or got a non-2XX status.
+
+		Example:
+
+			..sourcecode ::
+
+				for order in client.paginate(RestRequest('GET', '/orders'), CursorPagination()):
+					assert_json(order, expected_schema=order_schema)
+
+		"""
+		if prefetch < 1:
+			# A Queue of size 0 is unbounded
+			raise ValueError(f'prefetch must be at least 1 but got {prefetch}')
+		if strategy is None:
+			strategy = LinkHeaderPagination()
+
+		def url_for(query_params: dict) -> str:
+			return self._build_url(rest_request.path, {**rest_request.query_params, **query_params})
+
+		pages = Queue(maxsize=prefetch)
+		stop = threading.Event()
+
+		def put(page) -> bool:
+			while not stop.is_set():
+				try:
+					pages.put(page, timeout=0.1)
+					return True
+				except Full:
+					continue
+			return False
+
+		def fetch_pages():
+			try:
+				url = strategy.first_url(url_for)
+				items_seen = 0
+				num_pages = 0
+				while url is not None and (max_pages is None or num_pages < max_pages):
+					response = self._request(rest_request.method, url, dict(rest_request.headers),
+						rest_request.body, path_template=rest_request.path_template)
+					response.raise_for_status()
+					items = strategy.items(response)
+					items_seen += len(items)
+					num_pages += 1
+					url = strategy.next_url(response, items, items_seen, url_for)
+					if not put(items):
+						return
+				put(None)
+			except Exception as e:	# pylint: disable=broad-exception-caught
+				put(e)
+
+		thread = threading.Thread(target=fetch_pages, daemon=True)
+		thread.start()
+		try:
+			while True:
+				page = pages.get()
+				if page is None:
+					return
+				if isinstance(page, Exception):
+					raise page
+				yield from page
+		finally:
+			stop.set()
+			thread.join()
 
 
 	def get(self, path: str,
@@ -96,7 +466,7 @@ class RestClient():
 			query_params: Optional[dict] = None) -> requests.Response:
 
 		url = self._build_url(path, query_params)
-		return self._request('GET', url, headers)
+		return self._request('GET', url, headers, path_template=path)
 
 
 	def post(self, path: str,
@@ -113,7 +483,7 @@ class RestClient():
 
 		"""
 		url = self._build_url(path, query_params)
-		return self._request('POST', url, headers, body)
+		return self._request('POST', url, headers, body, path_template=path)
 
 
 	def patch(self, path: str,
@@ -122,7 +492,7 @@ class RestClient():
 			query_params: Optional[dict] = None) -> requests.Response:
 
 		url = self._build_url(path, query_params)
-		return self._request('PATCH', url, headers, body)
+		return self._request('PATCH', url, headers, body, path_template=path)
 
 
 	def put(self, path: str,
@@ -131,7 +501,7 @@ class RestClient():
 			query_params: Optional[dict] = None) -> requests.Response:
 
 		url = self._build_url(path, query_params)
-		return self._request('PUT', url, headers, body)
+		return self._request('PUT', url, headers, body, path_template=path)
 
 
 	def delete(self, path: str,
@@ -139,15 +509,23 @@ class RestClient():
 			query_params: Optional[dict] = None) -> requests.Response:
 
 		url = self._build_url(path, query_params)
-		return self._request('DELETE', url, headers)
+		return self._request('DELETE', url, headers, path_template=path)
+
+
+	def template(self, rest_request: RestRequest) -> RestRequestTemplate:
+		"""Returns a template that issues `rest_request` repeatedly with minimal overhead.
+
+		`RestRequest.path` may contain `{name}` placeholders, filled in at every call
+		of `RestRequestTemplate.request()`.
+
+		"""
+		return RestRequestTemplate(self, rest_request)
 
 
 	def _build_url(self, path: str, query_params=None) -> str:
 
 		if query_params:
-			query_params = [f'{param}={value}' for param, value in query_params.items()]
-			query_params = '&'.join(query_params)
-			url = f'{self._base_url}{path}?{query_params}'
+			url = f'{self._base_url}{path}?{urlencode(query_params, doseq=True)}'
 		else:
 			url = f'{self._base_url}{path}'
 
@@ -158,7 +536,10 @@ class RestClient():
 			method: str,
 			url: str,
 			headers: Optional[dict] = None,
-			body: Optional[dict] = None) -> requests.Response:
+			body: Optional[dict] = None,
+			stream: bool = False,
+			path_template: Optional[str] = None) -> requests.Response:
+		# pylint: disable=too-many-arguments
 
 		if self._api_key:
 			if headers is None:
@@ -168,7 +549,59 @@ class RestClient():
 		request = requests.Request(method, url, headers, json=body)
 		prepared_request = request.prepare()
 
-		return self._session.send(prepared_request, verify=self._verify, timeout=self._timeout)
+		return self._send(prepared_request, stream, path_template)
+
+
+	def _send(self,
+			prepared_request: requests.PreparedRequest,
+			stream: bool = False,
+			path_template: Optional[str] = None) -> requests.Response:
+
+		cassette = self.cassette
+		if cassette is not None and cassette.mode == REPLAY:
+			return cassette.replay(prepared_request)
+
+		if self.metrics is None:
+			response = self._session.send(prepared_request, verify=self._verify, timeout=self._timeout, stream=stream)
+		else:
+			response = self._timed_send(prepared_request, stream, path_template)
+
+		if cassette is not None and cassette.mode == RECORD:
+			cassette.record(prepared_request, response)
+
+		return response
+
+
+	def _timed_send(self,
+			prepared_request: requests.PreparedRequest,
+			stream: bool,
+			path_template: Optional[str]) -> requests.Response:
+
+		labels = {'method': prepared_request.method, 'path': path_template or urlsplit(prepared_request.url).path}
+		metrics = self.metrics
+
+		_connect_timing.seconds = 0.0
+		start = time.perf_counter()
+		try:
+			# The body is read below to time its transfer separately
+			response = self._session.send(prepared_request, verify=self._verify, timeout=self._timeout, stream=True)
+			ttfb = time.perf_counter() - start
+			if not stream:
+				response.content	# pylint: disable=pointless-statement
+		except Exception as e:
+			metrics.counter('testessera_rest_errors_total', exception=type(e).__name__, **labels).inc()
+			raise
+		total = time.perf_counter() - start
+
+		metrics.counter('testessera_rest_requests_total', status=str(response.status_code), **labels).inc()
+		if _connect_timing.seconds:
+			metrics.histogram('testessera_rest_connect_seconds', **labels).record(_connect_timing.seconds)
+		metrics.histogram('testessera_rest_ttfb_seconds', **labels).record(ttfb)
+		if not stream:
+			metrics.histogram('testessera_rest_body_seconds', **labels).record(total - ttfb)
+			metrics.histogram('testessera_rest_total_seconds', **labels).record(total)
+
+		return response
 
 
 def assert_http_response(response: requests.Response, status_code: int, headers=None):
@@ -200,7 +633,7 @@ def assert_rest_response(
 		response (requests.Response):	Request response.
 		status_code (int):		Expected status code.
 		headers (Optional[dict]):	Expected headers.
-		json_instance (Optional[dict]):	Expected JSON instance.
+		json_instance (Optional[dict]):	Expected JSON instance, or `JsonMatcher`.
 		json_schema (Optional[dict]):	Expected JSON schema.
 
 	"""
@@ -224,6 +657,171 @@ def assert_rest_response(
 		assert_json(response.json(), json_instance, json_schema)
 
 
+class Convergence():
+	"""Outcome of `assert_eventually()`.
+
+	Attributes:
+		response (requests.Response):	First response that passed the assertion.
+		elapsed (float):		Seconds from the first request until the assertion passed.
+		attempts (int):			Number of requests issued.
+
+	"""
+	def __init__(self, response: requests.Response, elapsed: float, attempts: int):
+
+		self.response = response
+		self.elapsed = elapsed
+		self.attempts = attempts
+
+	def __str__(self):
+		return f'Convergence({self.response}, {self.elapsed:.3f}s, {self.attempts} attempts)'
+
+
+def assert_eventually(
+		client: RestClient,
+		rest_request: RestRequest,
+		timeout: float = 30.0,
+		initial_interval: float = 0.1,
+		max_interval: float = 5.0,
+		**assert_kwargs) -> Convergence:
+	# pylint: disable=too-many-arguments
+	"""Re-issues `rest_request` until `assert_rest_response()` passes or `timeout` expires.
+
+	Waits between attempts grow exponentially from `initial_interval` up to `max_interval`,
+	with random jitter so that concurrent tests do not poll in lockstep. If the client has a
+	metrics registry, the convergence time is recorded in the
+	`testessera_rest_convergence_seconds` histogram.
+
+	Args:
+		client (RestClient):		Client used to issue the request.
+		rest_request (RestRequest):	Request to issue.
+		timeout (float):		Maximum seconds to wait for the assertion to pass.
+		initial_interval (float):	Wait after the first failed attempt.
+		max_interval (float):		Maximum wait between attempts.
+		**assert_kwargs:		Keyword arguments of `assert_rest_response()`.
+
+	Returns:
+		Convergence:	Passing response, convergence time and number of attempts.
+
+	Raises:
+		AssertionError:	The last assertion error, if the assertion did not pass in time.
+
+	Example:
+
+		..sourcecode ::
+
+			convergence = assert_eventually(
+				orders_client,
+				RestRequest('GET', f'/orders/{order_id}'),
+				timeout=10.0,
+				status_code=200,
+				json_instance=expected_order
+			)
+
+	"""
+	start = time.perf_counter()
+	deadline = start + timeout
+	interval = initial_interval
+	attempts = 0
+
+	while True:
+		attempts += 1
+		response = client.request(rest_request)
+		try:
+			assert_rest_response(response, **assert_kwargs)
+		except AssertionError:
+			remaining = deadline - time.perf_counter()
+			if remaining <= 0:
+				raise
+			# Equal jitter: wait between half and the whole interval
+			time.sleep(min(interval / 2 + random.uniform(0, interval / 2), remaining))
+			interval = min(interval * 2, max_interval)
+			continue
+
+		elapsed = time.perf_counter() - start
+		if client.metrics is not None:
+			client.metrics.histogram(
+				'testessera_rest_convergence_seconds',
+				method=rest_request.method,
+				path=rest_request.path_template
+			).record(elapsed)
+
+		return Convergence(response, elapsed, attempts)
+
+
+def assert_rest_response_stream(
+		response: requests.Response,
+		status_code: int = SUCCESS_2XX,
+		headers=None,
+		item_schema=None,
+		max_failures: int = 1,
+		chunk_size: int = 65536) -> int:
+	# pylint: disable=too-many-arguments
+	"""Asserts a REST response whose body is a JSON array, parsing it incrementally.
+
+	Array items are validated against `item_schema` as they are downloaded and discarded
+	afterwards, so memory usage does not depend on the body size. The response should be
+	requested with `RestClient.request(rest_request, stream=True)`.
+
+	Args:
+		response (requests.Response):	Request response.
+		status_code (int):		Expected status code.
+		headers (Optional[dict]):	Expected headers.
+		item_schema (Optional[dict]):	Expected JSON schema of every array item.
+		max_failures (int):		Number of failing items after which the body is not
+			read any further.
+		chunk_size (int):		Bytes read from the response at a time.
+
+	Returns:
+		int:	Number of array items read.
+
+	Raises:
+		AssertionError:	The status code, headers or any item don't match.
+		ValueError:	The body is not a JSON array.
+
+	Example:
+
+		..sourcecode ::
+
+			response = client.request(RestRequest('GET', '/exports/orders'), stream=True)
+
+			assert_rest_response_stream(response, 200, item_schema=order_schema, max_failures=10)
+
+	"""
+	with response:
+		if status_code:
+			assert response.status_code == status_code,	\
+				f'Expected status was {status_code} but got status {response.status_code} and response body {response.text}'
+		else:
+			assert response.status_code // 100 == 2,	\
+				f'Expected 2XX status but got status {response.status_code} and response body {response.text}'
+
+		if headers:
+			for header, value in headers.items():
+				assert response.headers[header].casefold() == value.casefold()
+
+		content_type = response.headers.get('Content-Type', '')
+		assert content_type == 'application/json' or content_type.startswith('application/json;'),	\
+			f'Expected Content-Type application/json but got {content_type}'
+
+		validator = schema_validator_cache.get(item_schema) if item_schema else None
+		failures = []
+		num_items = 0
+		for index, item in enumerate(iter_json_array(response.iter_content(chunk_size))):
+			num_items += 1
+			if validator is None:
+				continue
+			error = jsonschema.exceptions.best_match(validator.iter_errors(item))
+			if error is not None:
+				failures.append(f'Item {index}: {error.message}')
+				if len(failures) >= max_failures:
+					break
+
+	assert not failures,	\
+		'JSON array items do not match the expected schema. ' + '\n'.join(failures)
+
+	return num_items
+
+
 def assert_problem_json_response(
 		response: requests.Response,
 		status_code: int,
@@ -0,0 +1,136 @@
+from typing import Optional
+import httpx
+from testessera.rest import RestRequest, RestClient
+
+
+class AsyncRestClient():
+	"""asyncio counterpart of `RestClient`.
+
+	It accepts the same `RestRequest` objects as `RestClient` and returns `httpx.Response`
+	objects, which expose `status_code`, `headers`, `text` and `json()` and therefore can be
+	asserted with `assert_rest_response()`.
+
+	Attributes:
+		_base_url (str):		REST API base url. E.g. `https://api.thecatapi.com/v1`.
+		_api_key (str, optional):	API key.
+		_client (httpx.AsyncClient):	Underlaying `httpx.AsyncClient`. Connections are pooled
+			and kept alive across requests.
+
+	Example:
+
+		..sourcecode ::
+
+			async with AsyncRestClient('https://api.thecatapi.com/v1') as client:
+				responses = await asyncio.gather(
+					*(client.request(BreedGet(breed_id)) for breed_id in breed_ids)
+				)
+
+			for response in responses:
+				assert_rest_response(response, 200)
+
+	"""
+	def __init__(self, base_url: str, api_key=None, timeout: int = 60, verify=None,
+			max_connections: int = 100):
+		# pylint: disable=too-many-arguments
+		"""
+
+		Args:
+			max_connections (int):	Maximum number of connections in the pool. Also
+				the maximum number of keep-alive connections.
+
+		"""
+		self._base_url = base_url
+		self._api_key = api_key
+
+		limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+		self._client = httpx.AsyncClient(
+			timeout=timeout,
+			verify=True if verify is None else verify,
+			limits=limits
+		)
+
+
+	async def __aenter__(self):
+
+		return self
+
+
+	async def __aexit__(self, *exc_info):
+
+		await self.aclose()
+
+
+	async def aclose(self):
+		"""Closes the pooled connections. """
+
+		await self._client.aclose()
+
+
+	async def request(self, rest_request: RestRequest) -> httpx.Response:
+		"""
+
+		Raises:
+			httpx.HTTPError
+
+		"""
+		url = self._build_url(rest_request.path, rest_request.query_params)
+		return await self._request(rest_request.method, url, rest_request.headers, rest_request.body)
+
+
+	async def get(self, path: str,
+			headers: Optional[dict] = None,
+			query_params: Optional[dict] = None) -> httpx.Response:
+
+		url = self._build_url(path, query_params)
+		return await self._request('GET', url, headers)
+
+
+	async def post(self, path: str,
+			body: dict,
+			headers: Optional[dict] = None,
+			query_params: Optional[dict] = None) -> httpx.Response:
+
+		url = self._build_url(path, query_params)
+		return await self._request('POST', url, headers, body)
+
+
+	async def patch(self, path: str,
+			body: dict,
+			headers: Optional[dict] = None,
+			query_params: Optional[dict] = None) -> httpx.Response:
+
+		url = self._build_url(path, query_params)
+		return await self._request('PATCH', url, headers, body)
+
+
+	async def put(self, path: str,
+			body: dict,
+			headers: Optional[dict] = None,
+			query_params: Optional[dict] = None) -> httpx.Response:
+
+		url = self._build_url(path, query_params)
+		return await self._request('PUT', url, headers, body)
+
+
+	async def delete(self, path: str,
+			headers: Optional[dict] = None,
+			query_params: Optional[dict] = None) -> httpx.Response:
+
+		url = self._build_url(path, query_params)
+		return await self._request('DELETE', url, headers)
+
+
+	_build_url = RestClient._build_url	# pylint: disable=protected-access
+
+
+	async def _request(self,
+			method: str,
+			url: str,
+			headers: Optional[dict] = None,
+			body: Optional[dict] = None) -> httpx.Response:
+
+		if self._api_key:
+			headers = dict(headers) if headers else {}
+			headers['X-API-Key'] = self._api_key
+
+		return await self._client.request(method, url, headers=headers, json=body)